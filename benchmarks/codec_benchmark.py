@@ -0,0 +1,57 @@
+""" Benchmark do custo de decodificacao por mensagem de cada backend JSON,
+    usando mensagens no formato enviado por cada exchange.
+
+    Uso:
+        python -m asimov.interface.benchmarks.codec_benchmark [n]
+"""
+import sys
+import json
+from timeit import timeit
+# Asimov -----------------------------------------------------------------------
+from ..types.utils import codec
+
+
+def bitfinex_book_snapshot(levels=100):
+    book = [[9000.0 + i * 0.1, 1 + (i % 3), round(0.5 + i * 0.01, 8) * (1 if i < levels // 2 else -1)] for i in range(levels)]
+    return json.dumps([17082, book])
+
+
+MESSAGES = {
+    'binance aggTrade': json.dumps({'e': 'aggTrade', 'E': 1565000000123, 's': 'BTCUSDT', 'a': 163283929, 'p': '11650.01000000', 'q': '0.01500000', 'f': 179532731, 'l': 179532731, 'T': 1565000000120, 'm': True, 'M': True}),
+    'binance 24hrTicker': json.dumps({'e': '24hrTicker', 'E': 1565000000123, 's': 'BTCUSDT', 'p': '-90.47000000', 'P': '-0.770', 'w': '11622.73390305', 'x': '11745.09000000', 'c': '11654.61000000', 'Q': '0.05000000', 'b': '11654.06000000', 'B': '0.10000000', 'a': '11654.62000000', 'A': '0.93000000', 'o': '11745.08000000', 'h': '11937.94000000', 'l': '11294.09000000', 'v': '44390.83208200', 'q': '515945937.02570513', 'O': 1564913600123, 'C': 1565000000123, 'F': 163128220, 'L': 163283929, 'n': 155710}),
+    'binance executionReport': json.dumps({'e': 'executionReport', 'E': 1565000000123, 's': 'ETHBTC', 'c': 'mUvoqJxFIILMdfAW5iGSOW', 'S': 'BUY', 'o': 'LIMIT', 'f': 'GTC', 'q': '1.00000000', 'p': '0.10264410', 'P': '0.00000000', 'F': '0.00000000', 'g': -1, 'C': '', 'x': 'TRADE', 'X': 'PARTIALLY_FILLED', 'r': 'NONE', 'i': 4293153, 'l': '0.50000000', 'z': '0.50000000', 'L': '0.10264410', 'n': '0.00050000', 'N': 'BNB', 'T': 1565000000120, 't': 1234, 'I': 8641984, 'w': True, 'm': True, 'M': False, 'O': 1565000000000, 'Z': '0.05132205', 'Y': '0.05132205', 'Q': '0.00000000'}),
+    'bitfinex trade': json.dumps([17470, 'te', [401597395, 1574694475039, 0.005, 7244.9]]),
+    'bitfinex book update': json.dumps([17082, [7254.7, 3, 3.3]]),
+    'bitfinex book snapshot (100)': bitfinex_book_snapshot(),
+    'bitfinex ticker': json.dumps([17049, [7276.1, 45.4, 7276.2, 39.1, -120.8, -0.0163, 7276.1, 3958.8, 7428.4, 7087.1]]),
+    'bitmex trade': json.dumps({'table': 'trade', 'action': 'insert', 'data': [{'timestamp': '2019-11-25T15:14:35.112Z', 'symbol': 'XBTUSD', 'side': 'Sell', 'size': 1500, 'price': 7244.5, 'tickDirection': 'MinusTick', 'trdMatchID': 'c8b7c8ea-1a47-1f8a-6a8e-1e2c5e58c4c9', 'grossValue': 20706000, 'homeNotional': 0.20706, 'foreignNotional': 1500}]}),
+    'bitmex quote': json.dumps({'table': 'quote', 'action': 'insert', 'data': [{'timestamp': '2019-11-25T15:14:35.112Z', 'symbol': 'XBTUSD', 'bidSize': 452710, 'bidPrice': 7244.5, 'askPrice': 7245, 'askSize': 1061520}]}),
+    'kraken book update': json.dumps([1234, {'a': [['5541.30000', '2.50700000', '1534614248.456738'], ['5542.50000', '0.40100000', '1534614248.456738']]}, {'b': [['5541.20000', '1.52900000', '1534614248.765567']], 'c': '974942666'}]),
+    'kraken trade': json.dumps([1234, [['5541.20000', '0.15850568', '1534614057.321597', 's', 'l', ''], ['6060.00000', '0.02455000', '1534614057.324998', 'b', 'l', '']]]),
+    'poloniex book update': json.dumps([148, 573030384, [['o', 1, '0.02958000', '0.80000000'], ['o', 0, '0.02959000', '0.00000000'], ['t', '44231389', 0, '0.02958000', '0.05000000', 1565000000]]]),
+    'poloniex ticker': json.dumps([1002, None, [149, '382.98901522', '381.99755898', '379.41296309', '-0.04312950', '14969820.94951828', '38859.58435407', 0, '412.25844455', '364.56122072']]),
+    'hitbtc ticker': json.dumps({'jsonrpc': '2.0', 'method': 'ticker', 'params': {'ask': '0.054464', 'bid': '0.054463', 'last': '0.054463', 'open': '0.057133', 'low': '0.053615', 'high': '0.057559', 'volume': '33068.346', 'volumeQuote': '1832.687530809', 'timestamp': '2019-11-25T15:14:35.112Z', 'symbol': 'ETHBTC'}}),
+    'hitbtc trades': json.dumps({'jsonrpc': '2.0', 'method': 'updateTrades', 'params': {'data': [{'id': 54469813, 'price': '0.054670', 'quantity': '0.183', 'side': 'buy', 'timestamp': '2019-11-25T15:14:35.112Z'}], 'symbol': 'ETHBTC'}}),
+}
+
+
+def run(n=20000):
+    backends = sorted(codec.BACKENDS)
+    print('Decode cost per message in microseconds (n = {})'.format(n))
+    print('Active backend: loads = {}, dumps = {}'.format(codec.LOADS_BACKEND, codec.DUMPS_BACKEND))
+    print('{:<32}'.format('message') + ''.join(['{:>12}'.format(b) for b in backends]) + '{:>12}'.format('bytes'))
+    for name in MESSAGES:
+        message = MESSAGES[name]
+        encoded = message.encode('utf-8')
+        row = '{:<32}'.format(name)
+        for backend in backends:
+            decode = codec.BACKENDS[backend][0]
+            data = encoded if backend != 'json' else message
+            elapsed = timeit(lambda: decode(data), number=n)
+            row += '{:>12.2f}'.format(elapsed / n * 1000000)
+        row += '{:>12}'.format(len(encoded))
+        print(row)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
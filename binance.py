@@ -11,6 +11,7 @@ from .connectors.poll import Poll
 from .connectors.rest import Rest
 from .connectors.websocket import WebSocket
 from .types.exchange import Exchange
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -18,6 +19,9 @@ class Binance(Exchange):
     def get_name(self):
         return 'binance'
 
+    def get_candle_format(self):
+        return {'index': 'close', 'unit': 1, 'descending': False, 'fields': {'volume': 'quote_volume'}}
+
     # Handlers -----------------------------------------------------------------
     def account_handler(self, message):
         event = None
@@ -27,7 +31,7 @@ class Binance(Exchange):
         notify = False
         raw = None
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
             if ('e' in data) and (data['e'] == 'executionReport'):
                 order_status = data['X']
@@ -86,7 +90,7 @@ class Binance(Exchange):
         timestamp = None
         notify = False
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
             if 'e' in data:
                 # Market Data --------------------------------------------------
@@ -96,6 +100,7 @@ class Binance(Exchange):
                         event = 'trade'
                         trade = trade_to_standard(self.name, data)
                         pair = trade["pair"]
+                        self.record_trade(trade)
                         last = {'last': trade['price']}
                         notify = self.marketdata.update_market_data(pair, last, side=trade['side'], tolerance=self.tolerance)
                         timestamp = data['T']/1000
@@ -213,11 +218,16 @@ class Binance(Exchange):
             return response
 
     def get_candles(self, pair, window, candle_size='1m'):
+        if candle_size == '1m':
+            candles = self.get_live_candles(pair, window)
+            if candles is not None:
+                return candles
         url = self.marketdata_rest.url
         command = '/api/v1/klines'
         params = {'symbol': pair_to_exchange(self.name, pair),
                   'interval': candle_size,
                   'limit': window}
+        fetched = time()
         response = self.marketdata_rest.query(method='get', url=url+command, params=params)
         if 'error' not in response:
             candles = []
@@ -226,6 +236,8 @@ class Binance(Exchange):
                              'close': float(raw_candle[4]),
                              'volume': float(raw_candle[7]),
                              'trades': raw_candle[8]}]
+            if candle_size == '1m':
+                self.backfill_candles(pair, candles, now=fetched)
             return candles
         else:
             return response
@@ -466,7 +478,7 @@ class Binance(Exchange):
             if 'error' in response:
                 update = {'message': error_to_standard(self.name, response), 'call': 'place_order', 'inputs': params}
                 self.notify('error', update, source='rest', raw=str(response))
-                print (self.account.balance)
+                print (self.account.get_data()['balance'])
             # else:
             #     if float(response['executedQty']) == 0:
             #         order = order_to_standard(self.name, response, source='rest')
@@ -519,14 +531,20 @@ class Binance(Exchange):
             sleep(0.5)
 
     def verify_account_data(self):
-        balance = self.get_balance()
-        error = self.account.validate_balance(balance)
-        self.notify('verify', update={'balance': error}, source='rest')
-
-        if self.account.orders is not None:
-            pairs = list(self.account.orders.keys())
-            for pair in pairs:
-                open_orders = self.get_open_orders(pair)
-                error = self.account.validate_orders(open_orders)
-                if pair in error:
-                    self.notify('verify', update={'open_orders': [pair]}, source='rest')
+        pairs, currencies = self.take_verification()
+        if currencies != []:
+            balance = self.get_balance()
+            if balance is None:
+                self.account.mark_dirty(currencies=currencies)
+            else:
+                error = self.account.validate_balance(balance, currencies=currencies)
+                self.notify('verify', update={'balance': error}, source='rest')
+
+        for pair in pairs:
+            open_orders = self.get_open_orders(pair)
+            if open_orders is None:
+                self.account.mark_dirty(pairs=[pair])
+                continue
+            error = self.account.validate_orders(open_orders, pairs=[pair])
+            if pair in error:
+                self.notify('verify', update={'open_orders': [pair]}, source='rest')
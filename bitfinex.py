@@ -14,6 +14,7 @@ from .connectors.poll import Poll
 from .connectors.rest import Rest
 from .connectors.websocket import WebSocket
 from .types.exchange import Exchange
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -21,6 +22,9 @@ class Bitfinex(Exchange):
     def get_name(self):
         return 'bitfinex'
 
+    def get_candle_format(self):
+        return {'index': 'open', 'unit': 1000, 'descending': True}
+
     # Handlers -----------------------------------------------------------------
     def marketdata_handler(self, message):
         event = None
@@ -29,7 +33,7 @@ class Bitfinex(Exchange):
         timestamp = None
         notify = False
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
             if 'event' in data:
                 if data['event'] == 'subscribed':
@@ -44,6 +48,7 @@ class Bitfinex(Exchange):
                             if len(raw_trade) >= 4:
                                 notify = self.marketdata.update_market_data(pair, {'last': raw_trade[-1]})
                                 update = trade_to_standard(self.name, raw_trade, pair=pair)
+                                self.record_trade(update)
                                 event = 'trade'
                                 elapsed = now - update['timestamp']
                     elif event == 'book':
@@ -83,8 +88,8 @@ class Bitfinex(Exchange):
         timestamp = None
         notify = False
         try:
-            print (message)
-            data = json.loads(message)
+            self.journal_raw('account', message)
+            data = codec.loads(message)
             if ('error' in data) and (data['error'] == 'closed'):
                 event = 'reset'
                 update = {'account': self.name}
@@ -223,11 +228,7 @@ class Bitfinex(Exchange):
         polls = {}
         # self.do_reset_book = {}
         if 'book' in subs:
-            polls['book'] = {'update': {}, 'reset': {}}
-            for pair in subs['book']:
-                polls['book']['update'][pair] = Poll(self.book_update, args=[pair])
-                # self.do_reset_book[pair] = Event()
-                # polls['book']['reset'][pair] = Poll(self.reset_book, args=[pair], trigger=self.do_reset_book[pair], imediate=False)
+            polls['book'] = self.start_book_engine()
         return polls
 
     def get_marketdata_rest(self):
@@ -296,15 +297,20 @@ class Bitfinex(Exchange):
 
     # Snapshot Requests --------------------------------------------------------
     def get_candles(self, pair, window):
+        candles = self.get_live_candles(pair, window)
+        if candles is not None:
+            return candles
         url = self.marketdata_rest.url
         command = 'candles/trade:1m:t' + pair_to_exchange(self.name, pair) + '/hist'
         params = {'limit': window, 'sort': -1}
+        fetched = time()
         response = self.marketdata_rest.query(method='get', url=url+command, params=params)
         if 'error' not in response:
             candles = []
             for raw_candle in response:
                 candles += [{'index': int(raw_candle[0]),
                              'close': raw_candle[2]}]
+            self.backfill_candles(pair, candles, now=fetched)
             return candles
         else:
             return response
@@ -11,6 +11,7 @@ from .connectors.hot_websocket import HotWebSocket
 from .connectors.rest import Rest
 from .connectors.poll import Poll
 from .types.exchange import Exchange
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -18,9 +19,12 @@ class Bitmex(Exchange):
     def get_name(self):
         return 'bitmex'
 
+    def get_candle_format(self):
+        return {'index': 'close', 'unit': 1, 'descending': True}
+
     # Handlers -----------------------------------------------------------------
     def account_handler(self, message):
-        json_response = json.loads(message)
+        json_response = codec.loads(message)
 
         if 'order' in json_response['table']:
             if 'insert' in json_response['action']:
@@ -81,7 +85,7 @@ class Bitmex(Exchange):
         event = None
         update = None
         try:
-            json_response = json.loads(message)
+            json_response = codec.loads(message)
             if 'data' in json_response:
                 pair = pair_to_standard(self.name, json_response["data"][-1]["symbol"])
                 if "trade" in json_response["table"]:
@@ -89,6 +93,8 @@ class Bitmex(Exchange):
                     last = {'last': float(json_response["data"][-1]["price"])}
                     self.marketdata.update_market_data(pair, last)
                     notify = True
+                    for raw_trade in json_response["data"]:
+                        self.record_trade(trade_to_standard(self.name, raw_trade), pair=pair)
                     trade = trade_to_standard(self.name, json_response["data"][-1])
                     elapsed = time() - trade['timestamp']
                     update = trade
@@ -438,6 +444,9 @@ class Bitmex(Exchange):
 
     # Snapshot Requests --------------------------------------------------------
     def get_candles(self, pair, window):
+        candles = self.get_live_candles(pair, window)
+        if candles is not None:
+            return candles
         url = "https://www.bitmex.com/api/v1"
         command = '/trade/bucketed'
         params = {'symbol': pair,
@@ -445,12 +454,14 @@ class Bitmex(Exchange):
                   'partial': 'false',
                   'count': window,
                   'reverse': 'true'}
+        fetched = time()
         response = self.marketdata_rest.query(method='get', url=url+command, params=params)
         if 'error' not in response:
             candles = []
             for raw_candle in response:
                 candles += [{'index': int(datetime.strptime(raw_candle['timestamp'], '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc).timestamp()),
                              'close': raw_candle['close']}]
+            self.backfill_candles(pair, candles, now=fetched)
             return candles
         else:
             return response
@@ -9,6 +9,7 @@ from .connectors.poll import Poll
 from .connectors.rest import Rest
 from .connectors.websocket import WebSocket
 from .types.exchange import Exchange
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -22,7 +23,7 @@ class Cex(Exchange):
         update = None
         notify = False
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
 
 
@@ -37,7 +38,7 @@ class Cex(Exchange):
         update = None
         notify = False
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
 
 
@@ -0,0 +1,77 @@
+from queue import Queue
+from zlib import crc32
+from datetime import datetime
+from threading import Thread
+
+
+class BookEngine:
+    """ Aplica as entradas de book de todos os pares com um numero fixo de
+        threads. Cada par e sempre atendido pela mesma thread (shard), o que
+        preserva a ordem das entradas de um mesmo par sem uma fila e uma thread
+        por par. Cada thread retira da fila tudo o que esta pendente e aplica as
+        entradas em um lote por par. """
+    def __init__(self, apply, shards=1, batch_size=1000):
+        """ Inicializacao da classe
+
+            Args:
+                apply (callable): Funcao que recebe o par e a lista de entradas
+                    de book do par, em ordem, e as aplica
+                shards (int): Numero de threads. Os pares sao distribuidos
+                    entre elas por hash
+                batch_size (int): Numero maximo de entradas retiradas da fila
+                    de uma vez
+        """
+        self.apply = apply
+        self.shards = max(1, shards)
+        self.batch_size = batch_size
+        self.queues = [Queue() for i in range(self.shards)]
+        self.shard_by_pair = {}
+        # Stats ----------------------------------------------------------------
+        self.applied = [0] * self.shards
+        self.batches = [0] * self.shards
+        self.errors = 0
+        # Workers --------------------------------------------------------------
+        self.threads = [Thread(target=self.run, args=[i], daemon=True) for i in range(self.shards)]
+        for th in self.threads:
+            th.start()
+
+    def get_shard(self, pair):
+        if pair not in self.shard_by_pair:
+            self.shard_by_pair[pair] = crc32(pair.encode()) % self.shards
+        return self.shard_by_pair[pair]
+
+    def put(self, entry):
+        """ Enfileira uma entrada de book no shard do seu par
+
+            Args:
+                entry (dict): Entrada de book com a chave 'pair'
+        """
+        self.queues[self.get_shard(entry['pair'])].put(entry)
+
+    def run(self, i):
+        queue = self.queues[i]
+        while True:
+            entries = [queue.get()]
+            while (len(entries) < self.batch_size) and (not queue.empty()):
+                entries += [queue.get()]
+            batches = {}
+            for entry in entries:
+                if entry['pair'] not in batches:
+                    batches[entry['pair']] = []
+                batches[entry['pair']] += [entry]
+            for pair in batches:
+                try:
+                    self.apply(pair, batches[pair])
+                    self.applied[i] += len(batches[pair])
+                    self.batches[i] += 1
+                except Exception as e:
+                    self.errors += 1
+                    print(datetime.now(), '- [ BookEngine ] Error applying entries for', pair, str(e))
+
+    def get_stats(self):
+        return {'shards': self.shards,
+                'pairs': len(self.shard_by_pair),
+                'pending': [q.qsize() for q in self.queues],
+                'applied': list(self.applied),
+                'batches': list(self.batches),
+                'errors': self.errors}
@@ -0,0 +1,202 @@
+from time import sleep
+from datetime import datetime
+from collections import deque
+from threading import Thread, Lock
+
+
+class BookSync:
+    """ Controle de integridade dos books alimentados por websocket. Confere a
+        sequencia das mensagens de cada par e, quando detecta uma falha (salto
+        de sequencia ou checksum invalido), busca um snapshot por REST. Enquanto
+        o snapshot nao chega, as atualizacoes do par sao guardadas em memoria e
+        depois reaplicadas sobre o snapshot novo, sem derrubar a assinatura. """
+    def __init__(self, marketdata, fetch_snapshot, retry_interval=1):
+        """ Inicializacao da classe
+
+            Args:
+                marketdata (MarketData): Destino das entradas de book
+                fetch_snapshot (callable): Funcao que recebe o par e retorna o
+                    book por REST no formato {'bid': {P: Q}, 'ask': {P: Q},
+                    'sequence': int ou None, 'timestamp': float ou None}, ou
+                    None em caso de erro
+                retry_interval (float): Espera minima em segundos entre duas
+                    tentativas de ressincronizar o mesmo par
+        """
+        self.marketdata = marketdata
+        self.fetch_snapshot = fetch_snapshot
+        self.retry_interval = retry_interval
+        self.sequence = {}
+        self.generation = {}
+        self.buffers = {}
+        self.lock = Lock()
+        # Stats ----------------------------------------------------------------
+        self.gaps = 0
+        self.checksum_errors = 0
+        self.resyncs = 0
+
+    def set_snapshot(self, pair, entry, sequence=None):
+        """ Aplica um snapshot recebido pelo proprio websocket
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                entry (dict): Entrada de book com as chaves 'pair', 'bid' e 'ask'
+                sequence (int): Numero de sequencia do snapshot
+        """
+        self.lock.acquire()
+        try:
+            if pair in self.buffers:
+                self.buffers[pair].append((sequence, [entry]))
+            else:
+                self.sequence[pair] = sequence
+                self.marketdata.queue_entry(entry)
+        finally:
+            self.lock.release()
+
+    def put(self, pair, entries, sequence=None, checksum=None):
+        """ Repassa as entradas de uma mensagem de book para o MarketData, ou as
+            guarda se o par estiver sendo ressincronizado
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                entries (list): Entradas de book da mensagem
+                sequence (int): Numero de sequencia da mensagem. Se informado,
+                    deve ser o anterior mais um
+                checksum (int): Checksum do book apos a mensagem. Se informado,
+                    e conferido pela thread de book depois de aplicar as entradas
+        """
+        if checksum is not None:
+            entries = entries + [{'pair': pair, 'checksum': checksum}]
+        self.lock.acquire()
+        try:
+            if pair in self.buffers:
+                self.buffers[pair].append((sequence, entries))
+                return
+            if (sequence is not None) and (self.sequence.get(pair) is not None) and (sequence != self.sequence[pair] + 1):
+                self.gaps += 1
+                print(datetime.now(), '- [ BookSync ] Sequence gap on', pair, '(expected', self.sequence[pair] + 1, 'got', str(sequence) + ')')
+                self.start_resync(pair)
+                self.buffers[pair].append((sequence, entries))
+                return
+            if sequence is not None:
+                self.sequence[pair] = sequence
+            self.queue(pair, entries)
+        finally:
+            self.lock.release()
+
+    def queue(self, pair, entries):
+        """ Enfileira as entradas de uma mensagem como um unico frame, para
+            que sejam aplicadas juntas """
+        generation = self.generation.get(pair, 0)
+        for entry in entries:
+            if 'checksum' in entry:
+                entry['generation'] = generation
+        if entries != []:
+            self.marketdata.queue_entry({'pair': pair, 'entries': entries})
+
+    def invalidate(self, pair, generation=None):
+        """ Chamada pela thread de book quando o checksum nao confere
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                generation (int): Geracao do book em que a entrada de checksum
+                    foi enfileirada. Falhas de geracoes ja ressincronizadas sao
+                    ignoradas
+        """
+        self.lock.acquire()
+        try:
+            if (pair not in self.buffers) and ((generation is None) or (generation == self.generation.get(pair, 0))):
+                self.checksum_errors += 1
+                print(datetime.now(), '- [ BookSync ] Checksum mismatch on', pair)
+                self.start_resync(pair)
+        finally:
+            self.lock.release()
+
+    def request_resync(self, pair):
+        """ Forca a ressincronizacao do par
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+        """
+        self.lock.acquire()
+        try:
+            self.start_resync(pair)
+        finally:
+            self.lock.release()
+
+    def start_resync(self, pair):
+        """ Passa a guardar as atualizacoes do par e dispara a busca do
+            snapshot. Deve ser chamada com lock adquirido
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+        """
+        if pair not in self.buffers:
+            self.buffers[pair] = deque()
+            self.generation[pair] = self.generation.get(pair, 0) + 1
+            Thread(target=self.resync, args=[pair], daemon=True).start()
+
+    def resync(self, pair):
+        while True:
+            sleep(self.retry_interval)
+            try:
+                snapshot = self.fetch_snapshot(pair)
+            except Exception as e:
+                print(datetime.now(), '- [ BookSync ] Error fetching snapshot for', pair + ':', str(e))
+                snapshot = None
+            if snapshot is None:
+                continue
+            self.lock.acquire()
+            try:
+                if self.replay(pair, snapshot):
+                    self.resyncs += 1
+                    del self.buffers[pair]
+                    return
+            finally:
+                self.lock.release()
+
+    def replay(self, pair, snapshot):
+        """ Aplica o snapshot e reaplica as mensagens guardadas que sao mais
+            novas que ele. Deve ser chamada com lock adquirido
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                snapshot (dict): Retorno de fetch_snapshot
+            Returns:
+                (bool): Se o book ficou consistente. Se as mensagens guardadas
+                    nao emendarem com o snapshot, e preciso buscar outro
+        """
+        sequence = snapshot.get('sequence')
+        timestamp = snapshot.get('timestamp')
+        buffered = list(self.buffers[pair])
+        if sequence is not None:
+            pending = [item for item in buffered if (item[0] is None) or (item[0] > sequence)]
+            expected = sequence + 1
+            for item in pending:
+                if item[0] is not None:
+                    if item[0] != expected:
+                        return False
+                    expected += 1
+        self.marketdata.queue_entry({'pair': pair, 'bid': snapshot['bid'], 'ask': snapshot['ask']})
+        for item in buffered:
+            if (sequence is not None) and (item[0] is not None) and (item[0] <= sequence):
+                continue
+            entries = item[1]
+            if timestamp is not None:
+                # Sem numero de sequencia, so reaplica os niveis mais novos que
+                # o snapshot; o checksum so vale se a mensagem inteira for nova
+                newer = [entry for entry in entries if ('checksum' in entry) or (entry.get('timestamp', timestamp + 1) > timestamp)]
+                if len(newer) < len(entries):
+                    newer = [entry for entry in newer if 'checksum' not in entry]
+                entries = newer
+            self.queue(pair, entries)
+            if item[0] is not None:
+                sequence = item[0]
+        self.sequence[pair] = sequence
+        self.buffers[pair].clear()
+        return True
+
+    def get_stats(self):
+        return {'gaps': self.gaps,
+                'checksum_errors': self.checksum_errors,
+                'resyncs': self.resyncs,
+                'resyncing': list(self.buffers)}
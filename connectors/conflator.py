@@ -0,0 +1,130 @@
+import heapq
+from time import time
+from threading import Thread, Condition
+
+
+CONFLATED_EVENTS = ['book', 'quote']
+
+
+def merge_ladder_changes(previous, update):
+    """ Junta as marcacoes de niveis alterados da escada de uma atualizacao de
+        book substituida as da atualizacao que a substitui, para que o
+        assinante saiba de todos os niveis que mudaram desde a ultima entrega.
+        Nao altera os dicionarios recebidos
+
+        Args:
+            previous (dict): Atualizacao {par: {...}} substituida
+            update (dict): Atualizacao {par: {...}} nova
+        Returns:
+            (dict): A propria 'update' se nao houver escada a juntar, ou uma
+                copia com as marcacoes 'changed' combinadas
+    """
+    if (not isinstance(previous, dict)) or (not isinstance(update, dict)):
+        return update
+    merged = None
+    for pair in update:
+        old = previous.get(pair)
+        new = update[pair]
+        if isinstance(old, dict) and isinstance(new, dict) and (old.get('depth') is not None) and (new.get('depth') is not None):
+            changed = {}
+            for book_side in new['depth']['changed']:
+                flags = old['depth']['changed'].get(book_side, [])
+                changed[book_side] = [flag or ((i < len(flags)) and flags[i]) for i, flag in enumerate(new['depth']['changed'][book_side])]
+            if merged is None:
+                merged = dict(update)
+            merged[pair] = dict(new, depth=dict(new['depth'], changed=changed))
+    return merged if merged is not None else update
+
+
+class Conflator:
+    """ Segura notificacoes de book/quote por par e emite no maximo uma por
+        intervalo, sempre com o valor mais recente. Trades e demais eventos
+        nao passam por aqui e portanto nunca sao atrasados ou reordenados. """
+    def __init__(self, publish, intervals):
+        """ Inicializacao da classe
+
+            Args:
+                publish (callable): Funcao chamada com (event, update, source,
+                    elapsed, raw) quando uma notificacao segura vence
+                intervals (dict): Intervalo minimo em segundos entre
+                    notificacoes. As chaves podem ser um par ('BTC/USDT'), um
+                    evento ('book') ou uma tupla (evento, par), nesta ordem de
+                    prioridade: (evento, par), par, evento
+        """
+        self.publish = publish
+        self.intervals = intervals
+        # State ----------------------------------------------------------------
+        self.last_emit = {}
+        self.pending = {}
+        self.deadlines = []
+        self.condition = Condition()
+        # Stats ----------------------------------------------------------------
+        self.held = 0
+        self.emitted = 0
+        # Timer ----------------------------------------------------------------
+        self.th_timer = Thread(target=self.run)
+        self.th_timer.start()
+
+    def get_interval(self, event, pair):
+        for key in [(event, pair), pair, event]:
+            if key in self.intervals:
+                return self.intervals[key]
+        return None
+
+    def hold(self, event, update, source=None, elapsed=None, raw=''):
+        """ Decide se a notificacao deve ser segurada
+
+            Returns:
+                (bool): True se a notificacao foi segurada e sera emitida
+                    depois pelo Conflator; False se deve ser emitida agora
+        """
+        if (event not in CONFLATED_EVENTS) or (not isinstance(update, dict)) or (len(update) != 1):
+            return False
+        pair = next(iter(update))
+        interval = self.get_interval(event, pair)
+        if not interval:
+            return False
+        key = (event, pair)
+        now = time()
+        self.condition.acquire()
+        try:
+            if key in self.pending:
+                update = merge_ladder_changes(self.pending[key][1], update)
+                self.pending[key] = (event, update, source, elapsed, raw)
+                self.held += 1
+                return True
+            elif (now - self.last_emit.get(key, 0)) >= interval:
+                self.last_emit[key] = now
+                self.emitted += 1
+                return False
+            else:
+                self.pending[key] = (event, update, source, elapsed, raw)
+                heapq.heappush(self.deadlines, (self.last_emit[key] + interval, key))
+                self.held += 1
+                self.condition.notify()
+                return True
+        finally:
+            self.condition.release()
+
+    def run(self):
+        while True:
+            self.condition.acquire()
+            while (self.deadlines == []) or (self.deadlines[0][0] > time()):
+                timeout = (self.deadlines[0][0] - time()) if self.deadlines != [] else None
+                self.condition.wait(timeout)
+            deadline, key = heapq.heappop(self.deadlines)
+            args = self.pending.pop(key, None)
+            if args is not None:
+                self.last_emit[key] = time()
+                self.emitted += 1
+            self.condition.release()
+            if args is not None:
+                try:
+                    self.publish(*args)
+                except Exception as e:
+                    print('CONFLATOR ERROR:', str(e), '| key:', key)
+
+    def get_stats(self):
+        return {'held': self.held,
+                'emitted': self.emitted,
+                'pending': len(self.pending)}
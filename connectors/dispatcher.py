@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from datetime import datetime
+from time import time, perf_counter_ns
+from threading import Thread, Condition
+# Asimov -----------------------------------------------------------------------
+from ..types.event import Notification
+from ..types.histogram import record_latency
+from .conflator import CONFLATED_EVENTS, merge_ladder_changes
+
+
+POLICIES = ['block', 'drop_oldest', 'conflate']
+
+
+class Dispatcher:
+    """ Entrega as notificacoes de um assinante a partir de uma fila propria,
+        em uma thread propria, para que um assinante lento nao segure a
+        leitura do WebSocket nem os demais assinantes. """
+    def __init__(self, subscriber, size=1000, policy='block', structured=False, raw=False, timeout=1):
+        """ Inicializacao da classe
+
+            Args:
+                subscriber (callable): Funcao que recebera as notificacoes
+                size (int): Numero maximo de notificacoes na fila
+                policy (str): O que fazer com a fila cheia. 'block' segura quem
+                    publica ate abrir espaco (no maximo 'timeout' segundos),
+                    'drop_oldest' descarta a mais antiga e 'conflate' mantem
+                    apenas a ultima notificacao de estado (book e quote) de
+                    cada (evento, par), no fim da fila. Os demais
+                    eventos (execucoes, erros, conta) seguem em ordem e nunca
+                    sao conflacionados; com a fila cheia, descarta antes a
+                    notificacao de estado mais antiga
+                structured (bool): Se o assinante recebe o objeto Notification
+                    em vez do JSON
+                raw (bool): Se o assinante, em modo JSON, recebe tambem o frame
+                    original
+                timeout (float): Espera maxima em segundos de quem publica na
+                    politica 'block'. Esgotada, a notificacao mais antiga e
+                    descartada
+        """
+        if policy not in POLICIES:
+            raise ValueError('Unknown dispatch policy: {}'.format(policy))
+        self.subscriber = subscriber
+        self.size = max(1, size)
+        self.policy = policy
+        self.structured = structured
+        self.raw = raw
+        self.timeout = timeout
+        # Queue ----------------------------------------------------------------
+        self.queue = OrderedDict()
+        self.condition = Condition()
+        self.counter = 0
+        # Stats ----------------------------------------------------------------
+        self.delivered = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latency = {}
+        self.running = True
+        # Worker ---------------------------------------------------------------
+        self.th_worker = Thread(target=self.run)
+        self.th_worker.start()
+
+    def put(self, notification, key=None):
+        """ Enfileira uma notificacao
+
+            Args:
+                notification (Notification): Evento a ser entregue
+                key (tuple): Chave (evento, par) usada pela politica 'conflate'
+        """
+        if (key is not None) and (key[0] not in CONFLATED_EVENTS):
+            key = None
+        self.condition.acquire()
+        try:
+            if (self.policy == 'conflate') and (key is not None) and (key in self.queue):
+                update = merge_ladder_changes(self.queue[key].update, notification.update)
+                if update is not notification.update:
+                    notification = Notification(dict(notification.to_dict(), update=update), raw=notification.raw)
+                # Vai para o fim da fila, depois dos eventos mais novos que a
+                # versao substituida, para manter a ordem de sequence
+                self.queue[key] = notification
+                self.queue.move_to_end(key)
+                self.conflated += 1
+            else:
+                if len(self.queue) >= self.size:
+                    if self.policy == 'block':
+                        deadline = time() + self.timeout
+                        while (len(self.queue) >= self.size) and (time() < deadline):
+                            self.condition.wait(deadline - time())
+                        if len(self.queue) >= self.size:
+                            self.queue.popitem(last=False)
+                            self.dropped += 1
+                    elif self.policy == 'conflate':
+                        self.drop_state()
+                    else:
+                        self.queue.popitem(last=False)
+                        self.dropped += 1
+                if (self.policy != 'conflate') or (key is None):
+                    self.counter += 1
+                    key = self.counter
+                self.queue[key] = notification
+                self.max_depth = max(self.max_depth, len(self.queue))
+            self.condition.notify_all()
+        finally:
+            self.condition.release()
+
+    def drop_state(self):
+        """ Descarta a notificacao de estado mais antiga da fila, ou a mais
+            antiga de todas se nao houver nenhuma. Deve ser chamada com
+            condition adquirida """
+        for key in self.queue:
+            if isinstance(key, tuple):
+                del self.queue[key]
+                break
+        else:
+            self.queue.popitem(last=False)
+        self.dropped += 1
+
+    def run(self):
+        while True:
+            self.condition.acquire()
+            while self.running and (len(self.queue) == 0):
+                self.condition.wait()
+            if len(self.queue) == 0:
+                self.condition.release()
+                break
+            key, notification = self.queue.popitem(last=False)
+            self.condition.notify_all()
+            self.condition.release()
+            try:
+                start = perf_counter_ns()
+                if self.structured:
+                    self.subscriber(notification)
+                elif self.raw:
+                    self.subscriber(notification.json, notification.raw)
+                else:
+                    self.subscriber(notification.json)
+                record_latency(self.latency, notification.event, start)
+                self.delivered += 1
+            except Exception as e:
+                self.errors += 1
+                print(datetime.now(), '- [ Dispatcher ] Subscriber error:', str(e), '| subs:', self.subscriber)
+
+    def close(self):
+        """ Encerra a thread de entrega apos esvaziar a fila """
+        self.condition.acquire()
+        self.running = False
+        self.condition.notify_all()
+        self.condition.release()
+
+    def get_stats(self):
+        """ Retorna os contadores da fila
+
+            Returns:
+                (dict): Profundidade atual e maxima da fila, entregues,
+                    descartadas, conflacionadas e erros do assinante
+        """
+        return {'policy': self.policy,
+                'size': self.size,
+                'depth': len(self.queue),
+                'max_depth': self.max_depth,
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'conflated': self.conflated,
+                'errors': self.errors}
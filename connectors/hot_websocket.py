@@ -1,5 +1,6 @@
 from time import sleep
 from asimov.interface.connectors.websocket import WebSocket
+from asimov.interface.types.utils import codec
 from asimov.interface.types.utils.utils import *
 from threading import Lock
 import json
@@ -41,7 +42,7 @@ class HotWebSocket:
             sleep(1)
 
     def dispatcher_handler(self, message, ws_id):
-        json_response = json.loads(message)
+        json_response = codec.loads(message)
 
         if ('data' in json_response) and ("trade" in json_response["table"]):
             # send always the fastest message
@@ -0,0 +1,185 @@
+import os
+import struct
+from collections import deque
+from datetime import datetime
+from threading import Thread, Event, Lock
+# Asimov -----------------------------------------------------------------------
+from ..types.utils import codec
+
+
+HEADER = struct.Struct('<I')
+
+
+class Journal:
+    """ Diario binario de eventos. O append apenas enfileira o registro em
+        memoria; uma thread em segundo plano serializa os registros em lote e
+        os grava em arquivos com prefixo de tamanho, rotacionando por tamanho.
+
+        Formato de cada registro: 4 bytes little-endian com o tamanho N do
+        payload, seguidos de N bytes de JSON em UTF-8. """
+    def __init__(self, path, max_bytes=64*1024*1024, max_files=10, flush_interval=1, batch_size=5000):
+        """ Inicializacao da classe
+
+            Args:
+                path (str): Prefixo dos arquivos. Os arquivos gerados sao
+                    '<path>.<n>.jnl', com n crescente
+                max_bytes (int): Tamanho a partir do qual o arquivo e rotacionado
+                max_files (int): Numero maximo de arquivos mantidos em disco. Se
+                    None, nenhum arquivo e apagado
+                flush_interval (float): Periodo em segundos entre gravacoes
+                batch_size (int): Numero de registros pendentes que antecipa a
+                    gravacao
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        # Buffer ---------------------------------------------------------------
+        self.buffer = deque()
+        self.wake = Event()
+        self.write_lock = Lock()
+        # File -----------------------------------------------------------------
+        directory = os.path.dirname(os.path.abspath(path))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        files = list_journal_files(path)
+        self.index = (journal_file_index(files[-1]) + 1) if files != [] else 0
+        self.file = None
+        self.size = 0
+        # Stats ----------------------------------------------------------------
+        self.written = 0
+        self.errors = 0
+        # Writer ---------------------------------------------------------------
+        self.th_writer = Thread(target=self.run)
+        self.th_writer.start()
+
+    def append(self, record):
+        """ Enfileira um registro. Nao serializa nem faz IO
+
+            Args:
+                record (dict): Registro serializavel em JSON
+        """
+        self.buffer.append(record)
+        if len(self.buffer) >= self.batch_size:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    def flush(self):
+        """ Grava todos os registros pendentes """
+        self.write_lock.acquire()
+        try:
+            chunks = []
+            n = len(self.buffer)
+            for i in range(n):
+                record = self.buffer.popleft()
+                try:
+                    payload = codec.dumpb(record)
+                except Exception as e:
+                    self.errors += 1
+                    print(datetime.now(), '- [ Journal ] Error encoding record:', str(e))
+                    continue
+                chunks += [HEADER.pack(len(payload)), payload]
+                self.size += HEADER.size + len(payload)
+                if self.size >= self.max_bytes:
+                    self.write(chunks)
+                    chunks = []
+                    self.rotate()
+            if chunks != []:
+                self.write(chunks)
+        except Exception as e:
+            self.errors += 1
+            print(datetime.now(), '- [ Journal ] Error writing:', str(e))
+        self.write_lock.release()
+
+    def write(self, chunks):
+        if self.file is None:
+            self.file = open('{}.{}.jnl'.format(self.path, self.index), 'ab')
+        self.file.write(b''.join(chunks))
+        self.file.flush()
+        self.written += len(chunks) // 2
+
+    def rotate(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.size = 0
+        self.index += 1
+        if self.max_files is not None:
+            files = list_journal_files(self.path)
+            for f in files[:max(0, len(files) - self.max_files + 1)]:
+                os.remove(f)
+
+    def close(self):
+        self.flush()
+        self.write_lock.acquire()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.write_lock.release()
+
+    def get_stats(self):
+        return {'pending': len(self.buffer),
+                'written': self.written,
+                'errors': self.errors,
+                'file_index': self.index}
+
+
+def journal_file_index(filename):
+    return int(filename.split('.')[-2])
+
+
+def list_journal_files(path):
+    """ Lista os arquivos de um diario em ordem de gravacao
+
+        Args:
+            path (str): Prefixo usado na criacao do Journal
+        Returns:
+            (list): Caminhos dos arquivos '<path>.<n>.jnl'
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    prefix = os.path.basename(path) + '.'
+    files = []
+    if os.path.isdir(directory):
+        for name in os.listdir(directory):
+            if name.startswith(prefix) and name.endswith('.jnl') and name[len(prefix):-4].isdigit():
+                files += [os.path.join(directory, name)]
+    return sorted(files, key=journal_file_index)
+
+
+def read_journal(path, start=None, end=None, event=None):
+    """ Le os registros de um diario
+
+        Args:
+            path (str): Prefixo usado na criacao do Journal
+            start (float): Se informado, ignora registros com timestamp menor
+            end (float): Se informado, ignora registros com timestamp maior
+            event (str/list): Se informado, retorna apenas estes eventos
+        Returns:
+            (generator): Registros em ordem de gravacao
+    """
+    events = [event] if isinstance(event, str) else event
+    for filename in list_journal_files(path):
+        with open(filename, 'rb') as f:
+            while True:
+                header = f.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    break
+                size = HEADER.unpack(header)[0]
+                payload = f.read(size)
+                if len(payload) < size:
+                    break
+                record = codec.loads(payload)
+                timestamp = record.get('timestamp', 0) if isinstance(record, dict) else 0
+                if (start is not None) and (timestamp < start):
+                    continue
+                if (end is not None) and (timestamp > end):
+                    continue
+                if (events is not None) and ((not isinstance(record, dict)) or (record.get('event') not in events)):
+                    continue
+                yield record
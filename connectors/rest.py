@@ -2,10 +2,11 @@ from time import sleep, time
 from datetime import datetime
 from threading import Thread, Event, Lock
 import requests
-import json
 import numpy as np
 import pandas as pd
 import scipy.stats as st
+# Asimov -----------------------------------------------------------------------
+from ..types.utils import codec
 
 
 class Rest:
@@ -88,9 +89,9 @@ class Rest:
             elapsed = r.elapsed.seconds + (r.elapsed.microseconds/1000000)
             try:
                 if r.status_code == 200:
-                    response = r.json()
+                    response = codec.loads(r.content)
                 else:
-                    response = {'error': {'code': r.status_code, 'message': r.json()}}
+                    response = {'error': {'code': r.status_code, 'message': codec.loads(r.content)}}
             except Exception as e:
                 response = {'error': str(e), 'message': r}
         except Exception as e:
@@ -2,7 +2,8 @@ from time import sleep, time
 from datetime import datetime
 from threading import Thread, Event, Lock
 from websocket import WebSocketApp
-import json
+# Asimov -----------------------------------------------------------------------
+from ..types.utils import codec
 
 
 class WebSocket:
@@ -78,7 +79,7 @@ class WebSocket:
 
     def __on_error(self, error):
         print(datetime.now(), '- [ WebSocket ] ERROR:', error)
-        self.handler(json.dumps({'error': error}))
+        self.handler(codec.dumps({'error': error}))
         if '429' in error:
             self.flood_lock.acquire()
             sleep(200)
@@ -87,7 +88,7 @@ class WebSocket:
     def __on_close(self):
         print(datetime.now(), '- [ WebSocket ] CLOSED!')
         self.on_handshake.set()
-        self.handler(json.dumps({'error': 'closed'}))
+        self.handler(codec.dumps({'error': 'closed'}))
 
     def __keep_alive(self, _t):
         while True:
@@ -115,7 +116,7 @@ class WebSocket:
             Args:
                 data (json): Payload que sera enviado
         """
-        message = json.dumps(data)
+        message = codec.dumps(data)
         if (self.th_websocket is not None) and (self.websocket is not None) and self.th_websocket.isAlive():
             try:
                 self.websocket.send(message)
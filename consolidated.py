@@ -0,0 +1,194 @@
+from time import time
+from datetime import datetime
+from threading import Lock
+# Asimov -----------------------------------------------------------------------
+from .types.utils import codec
+
+
+class Consolidated:
+    """ Melhor bid/ask de cada par consolidado entre varias interfaces. Assina
+        as notificacoes de book e quote de cada Exchange, guarda o topo de cada
+        venue e so notifica os assinantes quando o melhor preco consolidado (ou
+        a venue que o oferece) muda. """
+    def __init__(self, exchanges=[], subscriber=None, pairs=None, quantity=False):
+        """ Inicializacao da classe
+
+            Args:
+                exchanges (list): Interfaces (Exchange) a consolidar
+                subscriber (callable): Funcao handler das mensagens de topo
+                    consolidado
+                pairs (list): Pares consolidados. Se None, todos os pares
+                    notificados pelas interfaces
+                quantity (bool): Se mudancas apenas na quantidade do melhor
+                    preco tambem geram notificacao
+        """
+        self.pairs = pairs
+        self.quantity = quantity
+        self.exchanges = []
+        self.handlers = []
+        self.subscribers = []
+        self.quotes = {}
+        self.best = {}
+        self.venues = {}
+        self.sequence = 0
+        self.lock = Lock()
+        if subscriber is not None:
+            self.subscribe(subscriber)
+        for exchange in exchanges:
+            self.attach(exchange)
+
+    def subscribe(self, subscriber, structured=False):
+        """ Adiciona um assinante
+
+            Args:
+                subscriber (callable): Funcao que recebe cada mudanca de topo
+                structured (bool): Se recebe o dicionario em vez do JSON
+        """
+        self.lock.acquire()
+        self.subscribers += [(subscriber, structured)]
+        self.lock.release()
+
+    def attach(self, exchange):
+        """ Passa a consolidar o topo de uma interface
+
+            Args:
+                exchange (Exchange): Interface ja conectada
+        """
+        handler = lambda notification: self.on_notification(exchange, notification)
+        filter = {'book': self.pairs, 'quote': self.pairs} if self.pairs is not None else None
+        self.lock.acquire()
+        self.exchanges += [exchange]
+        self.handlers += [handler]
+        self.lock.release()
+        exchange.subscribe(handler, filter=filter, notify=False, delta=True, structured=True)
+        snapshot = exchange.marketdata.get_data()
+        self.update(exchange, [pair for pair in snapshot['bid'] if pair in snapshot['ask']])
+
+    def detach(self, exchange):
+        """ Deixa de consolidar uma interface e remove seus precos
+
+            Args:
+                exchange (Exchange): Interface adicionada com attach
+        """
+        self.lock.acquire()
+        if exchange not in self.exchanges:
+            self.lock.release()
+            return
+        i = self.exchanges.index(exchange)
+        handler = self.handlers[i]
+        del self.exchanges[i]
+        del self.handlers[i]
+        self.lock.release()
+        exchange.unsubscribe(handler)
+        self.lock.acquire()
+        try:
+            for pair in list(self.quotes):
+                if id(exchange) in self.quotes[pair]:
+                    del self.quotes[pair][id(exchange)]
+                    self.refresh(pair)
+        finally:
+            self.lock.release()
+
+    def on_notification(self, exchange, notification):
+        if notification.event in ['book', 'quote']:
+            snapshot = exchange.marketdata.get_data()
+            update = notification.update
+            pairs = list(update) if isinstance(update, dict) else [pair for pair in snapshot['bid'] if pair in snapshot['ask']]
+            self.update(exchange, pairs, snapshot=snapshot)
+
+    def update(self, exchange, pairs, snapshot=None):
+        """ Atualiza o topo de uma venue e recalcula o consolidado dos pares
+
+            Args:
+                exchange (Exchange): Interface que notificou
+                pairs (list): Pares com topo alterado
+                snapshot (dict): Versao do marketdata da interface
+        """
+        snapshot = exchange.marketdata.get_data() if snapshot is None else snapshot
+        self.lock.acquire()
+        try:
+            for pair in pairs:
+                if (self.pairs is not None) and (pair not in self.pairs):
+                    continue
+                bid = snapshot['bid'].get(pair)
+                ask = snapshot['ask'].get(pair)
+                if (bid is None) or (ask is None):
+                    continue
+                if pair not in self.quotes:
+                    self.quotes[pair] = {}
+                self.quotes[pair][id(exchange)] = (bid, snapshot['bid_quantity'].get(pair), ask, snapshot['ask_quantity'].get(pair), exchange.name)
+                self.refresh(pair, venue=id(exchange))
+        finally:
+            self.lock.release()
+
+    def refresh(self, pair, venue=None):
+        """ Recalcula o topo consolidado de um par e notifica se mudou. Se a
+            venue alterada nao era nem passou a ser a melhor, o topo continua o
+            mesmo sem percorrer as demais venues. Deve ser chamada com lock
+            adquirido. As venues sao as instancias adicionadas (id), para que
+            duas interfaces da mesma exchange nao se sobreponham; o nome da
+            exchange so e usado na mensagem
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                venue (int): id da interface cujo topo mudou. Se None,
+                    percorre todas
+        """
+        quotes = self.quotes.get(pair, {})
+        previous = self.best.get(pair)
+        venues = self.venues.get(pair)
+        if (venue is not None) and (previous is not None) and (venue in quotes):
+            bid, bid_quantity, ask, ask_quantity, name = quotes[venue]
+            if (venue not in venues) and (bid <= previous['bid']) and (ask >= previous['ask']):
+                return
+        best = None
+        for key in quotes:
+            bid, bid_quantity, ask, ask_quantity, name = quotes[key]
+            if best is None:
+                best = {'pair': pair,
+                        'bid': bid, 'bid_quantity': bid_quantity, 'bid_exchange': name,
+                        'ask': ask, 'ask_quantity': ask_quantity, 'ask_exchange': name}
+                best_venues = (key, key)
+                continue
+            if bid > best['bid']:
+                best['bid'], best['bid_quantity'], best['bid_exchange'] = bid, bid_quantity, name
+                best_venues = (key, best_venues[1])
+            if ask < best['ask']:
+                best['ask'], best['ask_quantity'], best['ask_exchange'] = ask, ask_quantity, name
+                best_venues = (best_venues[0], key)
+        if best is None:
+            self.best.pop(pair, None)
+            self.venues.pop(pair, None)
+            return
+        keys = ['bid', 'bid_exchange', 'ask', 'ask_exchange'] + (['bid_quantity', 'ask_quantity'] if self.quantity else [])
+        self.best[pair] = best
+        self.venues[pair] = best_venues
+        if (previous is None) or (best_venues != venues) or any([best[key] != previous[key] for key in keys]):
+            self.publish(best)
+
+    def publish(self, best):
+        self.sequence += 1
+        message = dict(best, event='consolidated', timestamp=time(), sequence=self.sequence)
+        encoded = None
+        for subscriber, structured in self.subscribers:
+            try:
+                if structured:
+                    subscriber(message)
+                else:
+                    if encoded is None:
+                        encoded = codec.dumps(message)
+                    subscriber(encoded)
+            except Exception as e:
+                print(datetime.now(), '- [ Consolidated ] Error notifying subscriber:', str(e))
+
+    def get_best(self, pair):
+        """ Retorna o topo consolidado de um par
+
+            Returns:
+                (dict): Melhor bid e ask, suas quantidades e as venues que os
+                    oferecem, ou None se nenhuma venue tiver o par
+        """
+        return self.best.get(pair)
+
+    def get_data(self):
+        return dict(self.best)
@@ -10,6 +10,7 @@ from .connectors.poll import Poll
 from .connectors.rest import Rest
 from .connectors.websocket import WebSocket
 from .types.exchange import Exchange
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -17,6 +18,9 @@ class Hitbtc(Exchange):
     def get_name(self):
         return 'hitbtc'
 
+    def get_candle_format(self):
+        return {'index': 'close', 'unit': 1, 'descending': True}
+
     # Handlers -----------------------------------------------------------------
     def marketdata_handler(self, message):
         event = None
@@ -24,7 +28,7 @@ class Hitbtc(Exchange):
         notify = False
         elapsed = None
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
             if 'method' in data:
                 # Trades -------------------------------------------------------
@@ -33,6 +37,8 @@ class Hitbtc(Exchange):
                     last = {'last': float(trade['price'])}
                     pair = pair_to_standard(self.name, data['params']['symbol'])
                     notify = self.marketdata.update_market_data(pair, last)
+                    for raw_trade in data['params']['data']:
+                        self.record_trade(trade_to_standard(self.name, raw_trade, pair=pair, source='rest'))
                     event = 'trade'
                     update = trade_to_standard(self.name, trade)
                     timestamp = datetime.strptime(trade['timestamp'], '%Y-%m-%dT%H:%M:%S.%fZ').replace(tzinfo=timezone.utc).timestamp()
@@ -60,7 +66,7 @@ class Hitbtc(Exchange):
         notify = False
         elapsed = None
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             now = time()
             if 'method' in data:
                 # Open Orders --------------------------------------------------
@@ -211,6 +217,9 @@ class Hitbtc(Exchange):
             return info
 
     def get_candles(self, pair, window):
+        candles = self.get_live_candles(pair, window)
+        if candles is not None:
+            return candles
         end = time()
         start = end - ((window + 1) * 60)
         response = self.get_trades(pair, start, end)
@@ -224,6 +233,7 @@ class Hitbtc(Exchange):
                 if index < candle_index:
                     candles += [{'index': int(candle_index), 'close': trade['price']}]
                     candle_index = index
+            self.backfill_candles(pair, candles, now=end)
             return candles
 
     def get_trades(self, pair, start, end):
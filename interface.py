@@ -1,4 +1,4 @@
-def Interface(exchange, subscriber=None, blueprint=None, logger=None, quick=False, hot=False, filter=None, book_depth=False, no_poll=False):
+def Interface(exchange, subscriber=None, blueprint=None, logger=None, quick=False, hot=False, filter=None, book_depth=False, no_poll=False, delta=False, dispatch=None, conflation=None, journal=None, depth=None, tape=10000, candles=[60]):
     """ Cria uma interface
 
         Args:
@@ -6,28 +6,44 @@ def Interface(exchange, subscriber=None, blueprint=None, logger=None, quick=Fals
             subscriber (callable): Funcao handler das mensagens enviadas pela interface
             blueprint (dict): Esquema que descreve o que deve conter na interface
             logger (asimov.Logger): Objeto logger Asimov
+            delta (bool): Se as notificacoes devem carregar apenas os objetos
+                alterados pelo evento em vez do estado completo
+            dispatch (str): Politica da fila de entrega assincrona do
+                subscriber ('block', 'drop_oldest' ou 'conflate'). Se None, o
+                subscriber e chamado na thread que gerou o evento
+            conflation (dict): Intervalo minimo em segundos entre notificacoes
+                de book/quote, por par ('BTC/USDT') ou por evento ('book')
+            journal (Journal): Diario binario que substitui o logger no
+                registro dos eventos
+            depth (int/dict): Numero de niveis do book enviados nas
+                notificacoes de book, global ou por par ({'BTC/USDT': 10})
+            tape (int/dict): Numero de trades do websocket mantidos em memoria
+                por par, global ou por par ({'BTC/USDT': 50000}). None desliga
+                o buffer
+            candles (list): Resolucoes, em segundos, dos candles montados a
+                partir dos trades do websocket. Lista vazia desliga os candles
         Returns:
             (Exchange): Interface
     """
     blueprint = {'marketdata': []} if blueprint is None else blueprint
     if exchange.lower() == 'binance':
         from .binance import Binance
-        return Binance(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Binance(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
     elif exchange.lower() == 'poloniex':
         from .poloniex import Poloniex
-        return Poloniex(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Poloniex(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
     elif exchange.lower() == 'hitbtc':
         from .hitbtc import Hitbtc
-        return Hitbtc(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Hitbtc(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
     elif exchange.lower() == 'bitmex':
         from .bitmex import Bitmex
-        return Bitmex(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Bitmex(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
     elif exchange.lower() == 'bitfinex':
         from .bitfinex import Bitfinex
-        return Bitfinex(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Bitfinex(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
     elif exchange.lower() == 'kraken':
         from .kraken import Kraken
-        return Kraken(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Kraken(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
     else:
         from .types.exchange import Exchange
-        return Exchange(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll)
+        return Exchange(subscriber=subscriber, blueprint=blueprint, filter=filter, logger=logger, quick=quick, hot=hot, book_depth=book_depth, no_poll=no_poll, delta=delta, dispatch=dispatch, conflation=conflation, journal=journal, depth=depth, tape=tape, candles=candles)
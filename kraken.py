@@ -3,6 +3,8 @@ import hashlib
 import hmac
 import urllib
 import base64
+from zlib import crc32
+from fractions import Fraction
 from time import sleep
 from threading import Event, Lock, Thread
 # Asimov -----------------------------------------------------------------------
@@ -10,6 +12,8 @@ from .connectors.poll import Poll
 from .connectors.websocket import WebSocket
 from .connectors.rest import Rest
 from .types.exchange import Exchange
+from .types.marketdata import QUANTITY_UNIT
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -17,6 +21,9 @@ class Kraken(Exchange):
     def get_name(self):
         return 'kraken'
 
+    def get_candle_format(self):
+        return {'index': 'open', 'unit': 1, 'descending': False}
+
     # Handlers -----------------------------------------------------------------
     def marketdata_handler(self, message):
         event = None
@@ -24,7 +31,7 @@ class Kraken(Exchange):
         notify = False
         elapsed = None
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
 
             update = data
             now = time()
@@ -36,26 +43,34 @@ class Kraken(Exchange):
                 event = self.channels[channel]['event']
                 pair = self.channels[channel]['pair']
                 if event == 'trade':
+                    for raw_trade in data[1]:
+                        self.record_trade(trade_to_standard(self.name, raw_trade, pair=pair))
                     update = trade_to_standard(self.name, data[1][-1], pair=pair)
                     notify = self.marketdata.update_market_data(pair, {'last': update['price']})
                     elapsed = now - update['timestamp']
                 elif event == 'book':
-                    if (len(data) == 2) and ('bs' in data[1]) and ('as' in data[1]):
+                    if isinstance(data[1], dict) and ('bs' in data[1]) and ('as' in data[1]):
                         raw_book = data[1]
                         entry = {'pair': pair,
                                  'bid': {item[0]: item[1] for item in raw_book['bs']},
                                  'ask': {item[0]: item[1] for item in raw_book['as']}}
-                        self.marketdata.queue_entry(entry)
+                        self.book_sync.set_snapshot(pair, entry)
                     else:
+                        entries = []
+                        checksum = None
                         for raw_book in data[1:]:
-                            for raw_side in raw_book:
-                                for raw_entry in raw_book[raw_side]:
-                                    if len(raw_entry) == 3:
-                                        entry = {'pair': pair,
-                                                 'side': 'bid' if raw_side == 'b' else 'ask',
-                                                 'price': raw_entry[0],
-                                                 'quantity': float(raw_entry[1])}
-                                        self.marketdata.queue_entry(entry)
+                            if isinstance(raw_book, dict):
+                                for raw_side in ['a', 'b']:
+                                    for raw_entry in raw_book.get(raw_side, []):
+                                        if len(raw_entry) >= 3:
+                                            entries += [{'pair': pair,
+                                                         'side': 'bid' if raw_side == 'b' else 'ask',
+                                                         'price': raw_entry[0],
+                                                         'quantity': float(raw_entry[1]),
+                                                         'timestamp': float(raw_entry[2])}]
+                                if 'c' in raw_book:
+                                    checksum = int(raw_book['c'])
+                        self.book_sync.put(pair, entries, checksum=checksum)
         except Exception as e:
             print (self.name, 'marketdata_handler', str(e), message)
         # Notify ---------------------------------------------------------------
@@ -63,7 +78,7 @@ class Kraken(Exchange):
             self.notify(event, update=update, source='websocket', elapsed=elapsed)
 
     def account_handler(self, message):
-        print (message)
+        self.journal_raw('account', message)
 
     # Connectors ---------------------------------------------------------------
     def get_marketdata_websocket(self, subs):
@@ -71,8 +86,9 @@ class Kraken(Exchange):
             s = []
             if 'book' in subs:
                 self.channels = {}
+                self.book_levels = 10
                 s_ = {'event': 'subscribe',
-                     'subscription': {'name': 'book'},
+                     'subscription': {'name': 'book', 'depth': self.book_levels},
                      'pair': [pair_to_exchange(self.name, p, method='new') for p in subs['book']]}
                 s += [s_]
 
@@ -125,12 +141,7 @@ class Kraken(Exchange):
         #         p += [Poll(self.update_ticker, args=[pair], trigger=self.do_update['book'][pair], frequency=1/5)]
         #     polls += [{'book': p}]
         if 'book' in subs:
-            polls = {}
-            polls['book'] = {'update': {}, 'reset': {}}
-            for pair in subs['book']:
-                polls['book']['update'][pair] = Poll(self.book_update, args=[pair])
-                # self.do_reset_book[pair] = Event()
-                # polls['book']['reset'][pair] = Poll(self.reset_book, args=[pair], trigger=self.do_reset_book[pair], imediate=False)
+            polls = {'book': self.start_book_engine()}
         return polls
 
     def get_account_rest(self):
@@ -292,12 +303,61 @@ class Kraken(Exchange):
                 update = {'response': str(response), 'call': 'update_ticker', 'inputs': {'pair': pair}}
                 self.notify('error', update, source='rest', elapsed=elapsed)
 
+    def verify_book_checksum(self, pair, checksum):
+        """ Confere o CRC32 dos 10 melhores niveis de cada lado enviado pela
+            Kraken. Com o tick igual ao pair_decimals, o preco em ticks ja e o
+            preco sem ponto e sem zeros a esquerda, que e o formato do checksum
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                checksum (int): Checksum recebido junto da atualizacao
+            Returns:
+                (bool): Se o book confere. Sem os filtros do par nao ha como
+                    conferir, e o book e considerado valido
+        """
+        if (not self.marketdata.has_filter(pair)) or (pair not in self.info) or (pair not in self.marketdata.book):
+            return True
+        scale = Fraction(self.info[pair]['quantity_filter']) * QUANTITY_UNIT
+        if scale.denominator != 1:
+            return True
+        scale = int(scale)
+        payload = ''
+        self.marketdata.book_lock.acquire()
+        try:
+            for book_side in ['ask', 'bid']:
+                for price, quantity in self.marketdata.book[pair][book_side].top(10):
+                    payload += str(price) + str(quantity // scale)
+        finally:
+            self.marketdata.book_lock.release()
+        return crc32(payload.encode()) == checksum
+
     # Snapshot Requests --------------------------------------------------------
+    def get_book_snapshot(self, pair):
+        url = 'https://api.kraken.com'
+        command = '/0/public/Depth'
+        data = {'pair': pair_to_exchange(self.name, pair), 'count': self.book_levels or 10}
+        response = self.marketdata_rest.query(method='post', url=url+command, data=data)
+        if 'result' not in response:
+            update = {'response': str(response), 'call': 'get_book_snapshot', 'inputs': {'pair': pair}}
+            self.notify('error', update, source='rest')
+            return None
+        response = response['result']
+        raw_book = response[list(response.keys())[0]]
+        timestamps = [float(item[2]) for item in raw_book['bids'] + raw_book['asks']]
+        return {'bid': {item[0]: item[1] for item in raw_book['bids']},
+                'ask': {item[0]: item[1] for item in raw_book['asks']},
+                'sequence': None,
+                'timestamp': max(timestamps) if timestamps != [] else None}
+
     def get_candles(self, pair, window):
+        candles = self.get_live_candles(pair, window)
+        if candles is not None:
+            return candles
         url = 'https://api.kraken.com'
         command = '/0/public/OHLC'
         raw_pair = pair_to_exchange(self.name, pair)
         data = {'pair': raw_pair, 'interval': 1}
+        fetched = time()
         response = self.marketdata_rest.query(method='post', url=url+command, data=data)
         if 'result' in response:
             if raw_pair in response['result']:
@@ -305,6 +365,7 @@ class Kraken(Exchange):
                 for raw_candle in response['result'][raw_pair]:
                     candles += [{'index': int(raw_candle[0]),
                                  'close': float(raw_candle[4])}]
+                self.backfill_candles(pair, candles, now=fetched)
                 return candles
 
     def get_trades(self, pair, window):
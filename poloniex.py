@@ -10,6 +10,7 @@ from .connectors.poll import Poll
 from .connectors.websocket import WebSocket
 from .connectors.rest import Rest
 from .types.exchange import Exchange
+from .types.utils import codec
 from .types.utils.utils import *
 
 
@@ -17,13 +18,16 @@ class Poloniex(Exchange):
     def get_name(self):
         return 'poloniex'
 
+    def get_candle_format(self):
+        return {'index': 'close', 'unit': 1, 'descending': True}
+
     # Handlers -----------------------------------------------------------------
     def marketdata_handler(self, message):
         event = None
         update = None
         notify = False
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             if len(data) > 0:
                 if data[0] == 1002:
                     if len(data) >= 3:
@@ -39,24 +43,27 @@ class Poloniex(Exchange):
                     if len(data) >= 3:
                         pair = pair_id_to_standard(self.name, data[0])
                         actual = data[1]
-                        if (pair in self.book_count) and (self.book_count[pair] != None):
-                            if (self.book_count[pair] + 1) == actual:
-                                self.book_count[pair] = actual
-                            else:
-                                self.do_reset_book[pair].set()
+                        entries = []
+                        snapshot = False
                         for raw_update in data[2]:
                             if raw_update[0] == 'i':
-                                self.book_count[pair] = actual
                                 entry = {'pair': pair,
                                          'bid': raw_update[1]['orderBook'][1],
                                          'ask': raw_update[1]['orderBook'][0]}
-                                self.marketdata.queue_entry(entry)
+                                self.book_sync.set_snapshot(pair, entry, sequence=actual)
+                                snapshot = True
                             elif raw_update[0] == 'o':
-                                entry = {'pair': pair,
-                                         'side': 'bid' if raw_update[1] == 1 else 'ask',
-                                         'price': raw_update[2],
-                                         'quantity': float(raw_update[-1])}
-                                self.marketdata.queue_entry(entry)
+                                entries += [{'pair': pair,
+                                             'side': 'bid' if raw_update[1] == 1 else 'ask',
+                                             'price': raw_update[2],
+                                             'quantity': float(raw_update[-1])}]
+                        # Todo frame do par avanca a sequencia, mesmo sem
+                        # entradas de book (apenas trades); o snapshot ja a
+                        # registrou em set_snapshot
+                        if not snapshot:
+                            self.book_sync.put(pair, entries, sequence=actual)
+                        elif entries != []:
+                            self.book_sync.put(pair, entries)
         except Exception as e:
             print (self.name, 'marketdata_handler', str(e), message)
         # Notify ---------------------------------------------------------------
@@ -69,7 +76,7 @@ class Poloniex(Exchange):
         notify = False
         now = time()
         try:
-            data = json.loads(message)
+            data = codec.loads(message)
             if ('error' in data) and (data['error'] == 'closed'):
                 event = 'reset'
                 update = {'account': self.name}
@@ -133,7 +140,6 @@ class Poloniex(Exchange):
         # s = []
         # if 'book' in subs:
         #     s += [{'command': 'subscribe', 'channel': 1002}]
-        #     self.book_count = {}
         #     for pair in subs['book']:
         #         s += [{'command': 'subscribe', 'channel': pair_to_exchange(self.name, pair)}]
         # if s != []:
@@ -245,18 +251,14 @@ class Poloniex(Exchange):
             self.notify('error', update, source='rest')
 
     def reset_book(self, pair):
-        self.logger.log('Interface', 'Reseting book subscription for ' + pair, print_only=True)
-        for sub in self.marketdata_websocket.subscriptions:
-            if sub['channel'] == pair_to_exchange(self.name, pair):
-                self.book_count[pair] = None
-                sub['command'] = 'unsubscribe'
-                self.marketdata_websocket.send(sub)
-                sleep(5)
-                sub['command'] = 'subscribe'
-                self.marketdata_websocket.send(sub)
+        self.logger.log('Interface', 'Resyncing book for ' + pair, print_only=True)
+        self.book_sync.request_resync(pair)
 
     # Snapshot Resquests -------------------------------------------------------
     def get_candles(self, pair, window):
+        candles = self.get_live_candles(pair, window)
+        if candles is not None:
+            return candles
         end = time()
         start = end - ((window + 1) * 60)
         response = self.get_trades(pair, start, end)
@@ -270,8 +272,23 @@ class Poloniex(Exchange):
                 if index < candle_index:
                     candles += [{'index': int(candle_index), 'close': trade['price']}]
                     candle_index = index
+            self.backfill_candles(pair, candles, now=end)
             return candles
 
+    def get_book_snapshot(self, pair):
+        params = {'command': 'returnOrderBook',
+                  'currencyPair': pair_to_exchange(self.name, pair),
+                  'depth': 100}
+        response = self.marketdata_rest.query(method='get', params=params)
+        if ('error' in response) or ('seq' not in response):
+            update = {'response': str(response), 'call': 'get_book_snapshot', 'inputs': {'pair': pair}}
+            self.notify('error', update, source='rest')
+            return None
+        return {'bid': {item[0]: item[1] for item in response['bids']},
+                'ask': {item[0]: item[1] for item in response['asks']},
+                'sequence': int(response['seq']),
+                'timestamp': None}
+
     def get_trades(self, pair, start, end):
         params = {'command': 'returnTradeHistory',
                   'currencyPair': pair_to_exchange(self.name, pair),
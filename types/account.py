@@ -8,12 +8,24 @@ import pandas as pd
 from datetime import datetime, timedelta, timezone
 from time import sleep, time
 from copy import deepcopy
-from threading import Thread, Event, Lock, Semaphore
+from fractions import Fraction
+from math import gcd
+from queue import Queue
+from threading import Thread, Event, Lock, Semaphore, current_thread
 # Asimov -----------------------------------------------------------------------
 from .utils.utils import *
+from .marketdata import QUANTITY_UNIT
 
 
 class Account:
+    """ Estado da conta (ordens, saldo e posicao). Todas as alteracoes sao
+        comandos executados em ordem por uma unica thread escritora, que
+        publica uma nova versao imutavel a cada alteracao. Os leitores usam a
+        versao publicada (get_data) e nunca esperam por lock. Quem altera o
+        estado apenas enfileira o comando: o retorno (se a alteracao deve ser
+        notificada) e calculado na propria thread a partir da localizacao das
+        ordens ja enfileiradas. Quem precisa ler as proprias alteracoes espera
+        a fila com sync. """
     def __init__(self, keys=[], secrets=[]):
         # Credentials ----------------------------------------------------------
         self.keys = keys
@@ -21,21 +33,98 @@ class Account:
         self.current_key = 0
         # Data -----------------------------------------------------------------
         self.orders = None
+        self.order_index = {}
+        self.order_sides = None
         self.balance = None
         self.position = None
         self.position_base = None
-        # Control --------------------------------------------------------------
-        self.order_lock = Lock()
-        self.balance_lock = Lock()
-        self.position_lock = Lock()
-        self.position_base_lock = Lock()
+        # Units ----------------------------------------------------------------
+        self.units = {}
+        # Verification ---------------------------------------------------------
+        self.dirty_pairs = set()
+        self.dirty_currencies = set()
+        self.sweep_pairs = 0
+        self.sweep_currencies = 0
+        self.dirty_lock = Lock()
+        # Snapshot -------------------------------------------------------------
+        self.version = 0
+        self.snapshot = None
+        self.publish(orders=True, balance=True, position=True, position_base=True)
+        # Writer ---------------------------------------------------------------
+        self.submit_lock = Lock()
+        self.commands = Queue()
+        self.th_writer = Thread(target=self.run, daemon=True)
+        self.th_writer.start()
+
+    def run(self):
+        while True:
+            command, args, kwargs = self.commands.get()
+            try:
+                command(*args, **kwargs)
+            except Exception as e:
+                print(datetime.now(), '- [ Account ] Error executing', command.__name__ + ':', str(e))
+            self.commands.task_done()
+
+    def execute(self, command, *args, **kwargs):
+        """ Enfileira um comando para a thread escritora, sem esperar sua
+            execucao. Comandos disparados pela propria thread escritora sao
+            executados diretamente
+
+            Args:
+                command (callable): Metodo que altera o estado
+        """
+        if current_thread() is self.th_writer:
+            command(*args, **kwargs)
+        else:
+            self.commands.put((command, args, kwargs))
+
+    def sync(self):
+        """ Espera a thread escritora executar todos os comandos enfileirados
+            ate aqui, para que get_data ja reflita as alteracoes. Retorna na
+            hora se a fila estiver vazia """
+        if (current_thread() is not self.th_writer) and (self.commands.unfinished_tasks > 0):
+            done = Event()
+            self.execute(done.set)
+            done.wait()
 
     def get_data(self):
-        d = {'orders': self.orders,
-             'balance': self.balance,
-             'position': self.position,
-             'position_base': self.position_base}
-        return d
+        """ Retorna a versao imutavel mais recente dos dados da conta, sem lock
+            e sem deepcopy. Nao deve ser alterada """
+        return self.snapshot
+
+    def publish(self, pair=None, orders=False, balance=False, position=False, position_base=False):
+        """ Publica uma nova versao copy-on-write dos dados da conta. Deve ser
+            chamada apenas pela thread escritora. Apenas as partes alteradas sao copiadas, as demais sao
+            compartilhadas com a versao anterior
+
+            Args:
+                pair (str): Se informado, apenas as ordens deste par sao copiadas
+                orders (bool): Se as ordens mudaram
+                balance (bool): Se o saldo mudou
+                position (bool): Se a posicao mudou
+                position_base (bool): Se a posicao base mudou
+        """
+        previous = self.snapshot if self.snapshot is not None else {'orders': None, 'balance': None, 'position': None, 'position_base': None}
+        d = dict(previous)
+        if orders:
+            if self.orders is None:
+                d['orders'] = None
+            elif (pair is not None) and (previous['orders'] is not None):
+                d['orders'] = dict(previous['orders'])
+                if pair in self.orders:
+                    d['orders'][pair] = {side: list(self.orders[pair][side]) for side in self.orders[pair]}
+                else:
+                    d['orders'].pop(pair, None)
+            else:
+                d['orders'] = {p: {side: list(self.orders[p][side]) for side in self.orders[p]} for p in self.orders}
+        if balance:
+            d['balance'] = {c: {k: self.from_units(c, v) for k, v in b.items()} for c, b in self.balance.items()} if self.balance is not None else None
+        if position:
+            d['position'] = {p: self.from_units(self.get_position_asset(p), v) for p, v in self.position.items()} if self.position is not None else None
+        if position_base:
+            d['position_base'] = dict(self.position_base) if self.position_base is not None else None
+        self.version += 1
+        self.snapshot = d
 
     def get_key(self):
         if len(self.keys) > 0:
@@ -48,16 +137,19 @@ class Account:
         return (self.orders is not None) and ((self.balance is not None) or (self.position is not None) or (self.position_base is not None))
 
     def has_open_orders(self, pair=None, book_side=None):
+        orders = self.snapshot['orders']
+        if orders is None:
+            return False
         if (pair is not None) and (book_side is not None):
-            return (pair in self.orders) and (self.orders[pair][book_side] != [])
+            return (pair in orders) and (orders[pair][book_side] != [])
+        elif pair is not None:
+            return (pair in orders) and any([orders[pair][s] != [] for s in orders[pair]])
         else:
             has = False
-            orders = deepcopy(self.orders)
-            if orders is not None:
-                for p in orders:
-                    for s in orders[p]:
-                        if orders[p][s] != []:
-                            has = True
+            for p in orders:
+                for s in orders[p]:
+                    if orders[p][s] != []:
+                        has = True
             return has
 
     def set_keys(self, keys, secrets):
@@ -66,77 +158,182 @@ class Account:
         self.current_key = 0
 
     def set_open_orders(self, orders, pair=None):
+        ok = False
+        if orders is not None:
+            self.submit_lock.acquire()
+            try:
+                new_orders = order_list_to_standard(orders) if isinstance(orders, list) else orders
+                if pair == None:
+                    self.order_sides = {}
+                    for p in new_orders:
+                        self.locate_orders(new_orders, p)
+                elif self.order_sides is not None:
+                    for id in [id for id in self.order_sides if self.order_sides[id][0] == pair]:
+                        del self.order_sides[id]
+                    if pair in new_orders:
+                        self.locate_orders(new_orders, pair)
+                self.execute(self.write_open_orders, new_orders, pair=pair)
+                ok = (pair == None) or (self.order_sides is not None)
+            except Exception as e:
+                print ('set_open_orders', str(e))
+            finally:
+                self.submit_lock.release()
+        return ok
+
+    def locate_orders(self, orders, pair):
+        """ Registra em order_sides o par e o lado de cada ordem de um par.
+            Deve ser chamada com submit_lock adquirido """
+        for book_side in orders[pair]:
+            for o in orders[pair][book_side]:
+                self.order_sides[o['id']] = (pair, book_side)
+
+    def write_open_orders(self, orders, pair=None):
         ok = False
         if orders is not None:
             if isinstance(orders, list):
                 new_orders = order_list_to_standard(orders)
             else:
                 new_orders = orders
-            self.order_lock.acquire()
             try:
                 if pair == None:
                     self.orders = new_orders
+                    self.order_index = {}
+                    for p in self.orders:
+                        self.index_orders(p)
                 elif pair in new_orders:
+                    self.unindex_orders(pair)
                     self.orders[pair] = new_orders[pair]
+                    self.index_orders(pair)
                 elif pair in self.orders:
+                    self.unindex_orders(pair)
                     self.orders[pair] = {'bid': [], 'ask': []}
+                self.publish(pair=pair, orders=True)
                 ok = True
             except Exception as e:
                 print ('set_open_orders', str(e))
-            self.order_lock.release()
         return ok
 
     def set_balance(self, balance, pair=None):
+        self.execute(self.write_balance, balance, pair=pair)
+        return balance is not None
+
+    def write_balance(self, balance, pair=None):
         ok = False
         if balance is not None:
-            self.balance_lock.acquire()
             try:
                 if pair == None:
-                    self.balance = balance
+                    self.balance = {c: self.balance_to_units(c, balance[c]) for c in balance}
                 else:
                     for x in pair.split('/'):
                         if (x in self.balance) and (x in balance):
-                            self.balance[x] = balance[x]
+                            self.balance[x] = self.balance_to_units(x, balance[x])
+                self.publish(balance=True)
                 ok = True
             except Exception as e:
                 print ('set_balance', str(e))
-            self.balance_lock.release()
         return ok
 
     def set_position(self, position, pair=None):
+        self.execute(self.write_position, position, pair=pair)
+        return position is not None
+
+    def write_position(self, position, pair=None):
         ok = False
         if position is not None:
-            self.position_lock.acquire()
             try:
                 if pair == None:
-                    self.position = position
+                    self.position = {p: self.to_units(self.get_position_asset(p), position[p]) for p in position}
                 elif (pair in self.position) and (pair in position):
-                    self.position[pair] = position[pair]
+                    self.position[pair] = self.to_units(self.get_position_asset(pair), position[pair])
+                self.publish(position=True)
                 ok = True
             except Exception as e:
                 print ('set_position', str(e))
-            self.position_lock.release()
         return ok
 
     def set_position_base(self, position, pair=None):
+        self.execute(self.write_position_base, position, pair=pair)
+        return position is not None
+
+    def write_position_base(self, position, pair=None):
         ok = False
         if position is not None:
-            self.position_base_lock.acquire()
             try:
                 if pair == None:
                     self.position_base = position
                 elif (pair in self.position_base) and (pair in position):
                     self.position_base[pair] = position[pair]
+                self.publish(position_base=True)
                 ok = True
             except Exception as e:
                 print ('set_position_base', str(e))
-            self.position_base_lock.release()
         return ok
 
+    # Units --------------------------------------------------------------------
+    def get_unit(self, asset):
+        """ Numero de unidades inteiras em uma unidade do ativo """
+        return self.units.get(asset, QUANTITY_UNIT)
+
+    def to_units(self, asset, value):
+        return int(round(float(value) * self.get_unit(asset)))
+
+    def from_units(self, asset, units):
+        return units / self.get_unit(asset)
+
+    def get_position_asset(self, pair):
+        """ Ativo em que a posicao do par e medida (o ativo base) """
+        return pair.split('/')[0]
+
+    def balance_to_units(self, currency, balance):
+        return {k: self.to_units(currency, v) for k, v in balance.items()}
+
+    def set_units(self, info):
+        """ Ajusta a resolucao inteira de cada ativo para que os passos de
+            quantidade e de nocional (preco x quantidade) dos pares sejam
+            inteiros. A resolucao minima e QUANTITY_UNIT e so aumenta; saldos
+            e posicoes ja guardados sao convertidos
+
+            Args:
+                info (dict): Informacoes dos pares no formato de get_info
+        """
+        self.execute(self.write_units, info)
+        return True
+
+    def write_units(self, info):
+        needed = {}
+        for pair in info:
+            if isinstance(info[pair], dict) and ('/' in pair):
+                base, quote = pair.split('/')
+                try:
+                    quantity = Fraction(str(info[pair].get('quantity_filter', Fraction(1, QUANTITY_UNIT))))
+                    price = Fraction(str(info[pair].get('price_filter', Fraction(1, QUANTITY_UNIT))))
+                except (ValueError, ZeroDivisionError):
+                    continue
+                for asset, step in [(base, quantity), (quote, quantity * price)]:
+                    if step > 0:
+                        unit = needed.get(asset, 1)
+                        needed[asset] = unit * step.denominator // gcd(unit, step.denominator)
+        for asset in needed:
+            unit = self.get_unit(asset)
+            new_unit = unit * needed[asset] // gcd(unit, needed[asset])
+            if new_unit != unit:
+                self.rescale_units(asset, new_unit // unit)
+                self.units[asset] = new_unit
+        return True
+
+    def rescale_units(self, asset, factor):
+        """ Multiplica por 'factor' os valores guardados em unidades do
+            ativo. Deve ser chamada pela thread escritora """
+        if (self.balance is not None) and (asset in self.balance):
+            self.balance[asset] = {k: v * factor for k, v in self.balance[asset].items()}
+        if self.position is not None:
+            for pair in self.position:
+                if self.get_position_asset(pair) == asset:
+                    self.position[pair] *= factor
+
     # Edit control -------------------------------------------------------------
     # Balance ------------------------------------------------------------------
     def update_balance(self, new_order, old_order=None, from_trade=False, fee_asset=None, absolute_fee=0):
-        self.balance_lock.acquire()
         try:
             if '/' in new_order['pair']:
                 a, b = new_order['pair'].split('/')
@@ -144,89 +341,162 @@ class Account:
                     self.balance[a] = {'available' : 0, 'reserved' : 0}
                 if not b in self.balance:
                     self.balance[b] = {'available' : 0, 'reserved' : 0}
+                # Quantidades em unidades inteiras do ativo base e nocionais em
+                # unidades do ativo cotado; cada valor e arredondado uma unica vez
+                new_quantity = self.to_units(a, new_order['quantity'])
+                new_notional = self.to_units(b, new_order['quantity'] * new_order['price'])
+                if old_order is not None:
+                    old_quantity = self.to_units(a, old_order['quantity'])
+                    old_notional = self.to_units(b, old_order['quantity'] * old_order['price'])
                 if from_trade:
                     side = new_order['side']
                     if side == 'buy':
-                        self.balance[a]['available'] += abs(old_order['quantity'] - new_order['quantity'])
-                        self.balance[b]['reserved'] -= abs((old_order['quantity'] * old_order['price']) - (new_order['quantity'] * new_order['price']))
+                        self.balance[a]['available'] += abs(old_quantity - new_quantity)
+                        self.balance[b]['reserved'] -= abs(old_notional - new_notional)
                     else:
-                        self.balance[a]['reserved'] -= abs(old_order['quantity'] - new_order['quantity'])
-                        self.balance[b]['available'] += abs((old_order['quantity'] * old_order['price']) - (new_order['quantity'] * new_order['price']))
+                        self.balance[a]['reserved'] -= abs(old_quantity - new_quantity)
+                        self.balance[b]['available'] += abs(old_notional - new_notional)
                     fee_asset = (a if side == 'buy' else b) if fee_asset == None else fee_asset
                     if fee_asset in self.balance:
-                        self.balance[fee_asset]['available'] -= absolute_fee
+                        self.balance[fee_asset]['available'] -= self.to_units(fee_asset, absolute_fee)
                 else:
                     if old_order is not None:
                         if new_order['side'] == 'buy':
-                            self.balance[b]['available'] -= (new_order['quantity'] * new_order['price']) - (old_order['quantity'] * old_order['price'])
-                            self.balance[b]['reserved'] += (new_order['quantity'] * new_order['price']) - (old_order['quantity'] * old_order['price'])
+                            self.balance[b]['available'] -= new_notional - old_notional
+                            self.balance[b]['reserved'] += new_notional - old_notional
                         elif new_order['side'] == 'sell':
-                            self.balance[a]['available'] -= new_order['quantity'] - old_order['quantity']
-                            self.balance[a]['reserved'] += new_order['quantity'] - old_order['quantity']
+                            self.balance[a]['available'] -= new_quantity - old_quantity
+                            self.balance[a]['reserved'] += new_quantity - old_quantity
                     else:
                         if new_order['side'] == 'buy':
-                            self.balance[b]['available'] -= new_order['quantity'] * new_order['price']
-                            self.balance[b]['reserved'] += new_order['quantity'] * new_order['price']
+                            self.balance[b]['available'] -= new_notional
+                            self.balance[b]['reserved'] += new_notional
                         elif new_order['side'] == 'sell':
-                            self.balance[a]['available'] -= new_order['quantity']
-                            self.balance[a]['reserved'] += new_order['quantity']
+                            self.balance[a]['available'] -= new_quantity
+                            self.balance[a]['reserved'] += new_quantity
+                self.mark_dirty(currencies=[a, b] + ([fee_asset] if fee_asset is not None else []))
+                self.publish(balance=True)
         except Exception as e:
             print ('update_balance', str(e))
-        self.balance_lock.release()
 
     # Position -----------------------------------------------------------------
     def update_position(self, new_order, old_order):
-        self.position_lock.acquire()
         try:
             direction = 1 if new_order['side'] == 'buy' else -1
             pair = new_order['pair']
+            asset = self.get_position_asset(pair)
             if pair not in self.position:
                 self.position[pair] = 0
-            self.position[pair] += direction * abs(old_order['quantity'] - new_order['quantity'])
+            self.position[pair] += direction * abs(self.to_units(asset, old_order['quantity']) - self.to_units(asset, new_order['quantity']))
+            self.mark_dirty(pairs=[pair])
+            self.publish(position=True)
         except Exception as e:
             print ('update_position', str(e))
-        self.position_lock.release()
 
     # Orders -------------------------------------------------------------------
+    def index_orders(self, pair):
+        """ Indexa as ordens de um par por id, com a posicao (par, lado,
+            indice) de cada uma em self.orders. Deve ser chamada pela
+            thread escritora """
+        for book_side in self.orders[pair]:
+            orders = self.orders[pair][book_side]
+            for i in range(len(orders)):
+                self.order_index[orders[i]['id']] = (pair, book_side, i)
+
+    def unindex_orders(self, pair):
+        """ Remove do indice as ordens de um par. Deve ser chamada pela
+            thread escritora """
+        if pair in self.orders:
+            for book_side in self.orders[pair]:
+                for o in self.orders[pair][book_side]:
+                    if self.order_index.get(o['id'], (None,))[0] == pair:
+                        del self.order_index[o['id']]
+
+    def find_order(self, id, pair, book_side):
+        """ Retorna a posicao de uma ordem em self.orders[pair][book_side]
+            pelo indice, ou None se ela nao estiver neste par e lado """
+        location = self.order_index.get(id)
+        if (location is not None) and (location[0] == pair) and (location[1] == book_side):
+            return location[2]
+        return None
+
     def insert_order(self, order):
+        notify = False
+        self.submit_lock.acquire()
+        try:
+            if isinstance(order, dict) and ('pair' in order) and (self.order_sides is not None):
+                location = (order['pair'], 'bid' if order['side'] == 'buy' else 'ask')
+                if self.order_sides.get(order['id']) != location:
+                    self.order_sides[order['id']] = location
+                    notify = True
+            self.execute(self.write_insert_order, order)
+        except Exception as e:
+            print ('insert_order', str(e))
+        finally:
+            self.submit_lock.release()
+        return notify
+
+    def write_insert_order(self, order):
         notify = False
         if isinstance(order, dict) and ('pair' in order):
             pair = order['pair']
-            self.order_lock.acquire()
             try:
                 book_side = 'bid' if order['side'] == 'buy' else 'ask'
                 if pair not in self.orders:
                     self.orders[pair] = {'bid': [], 'ask': []}
-                ids = [o['id'] for o in self.orders[pair][book_side]]
-                if order['id'] not in ids:
+                if self.find_order(order['id'], pair, book_side) is None:
                     self.orders[pair][book_side] += [order]
+                    self.order_index[order['id']] = (pair, book_side, len(self.orders[pair][book_side]) - 1)
+                    self.mark_dirty(pairs=[pair])
+                    self.publish(pair=pair, orders=True)
                     notify = True
                     if ('type' in order) and (order['type'] != 'margin'):
                         self.update_balance(order)
             except Exception as e:
                 print ('insert_order', str(e))
-            self.order_lock.release()
         return notify
 
     def update_order(self, id, order, from_trade=False, fee_asset=None, absolute_fee=0):
+        notify = False
+        self.submit_lock.acquire()
+        try:
+            if isinstance(order, dict) and ('quantity' in order) and ('pair' in order) and (self.order_sides is not None):
+                location = (order['pair'], 'bid' if order['side'] == 'buy' else 'ask')
+                if order['quantity'] > 0.00000001:
+                    if self.order_sides.get(id) == location:
+                        del self.order_sides[id]
+                        self.order_sides[order['id']] = location
+                        notify = True
+                elif self.order_sides.get(order['id']) == location:
+                    del self.order_sides[order['id']]
+                    notify = True
+            self.execute(self.write_update_order, id, order, from_trade=from_trade, fee_asset=fee_asset, absolute_fee=absolute_fee)
+        except Exception as e:
+            print ('update_order', str(e))
+        finally:
+            self.submit_lock.release()
+        return notify
+
+    def write_update_order(self, id, order, from_trade=False, fee_asset=None, absolute_fee=0):
         notify = False
         if isinstance(order, dict) and ('quantity' in order) and ('pair' in order):
             pair = order['pair']
             if order['quantity'] > 0.00000001:
-                self.order_lock.acquire()
                 try:
                     old = None
                     book_side = 'bid' if order['side'] == 'buy' else 'ask'
                     if pair in self.orders:
-                        for i in range(len(self.orders[pair][book_side])):
-                            o = self.orders[pair][book_side][i]
-                            if o['id'] == id:
-                                old = o.copy()
-                                if not from_trade:
-                                    order['old_id'] = id
-                                self.orders[pair][book_side][i] = order
-                                notify = True
-                                break
+                        i = self.find_order(id, pair, book_side)
+                        if i is not None:
+                            old = self.orders[pair][book_side][i].copy()
+                            if not from_trade:
+                                order['old_id'] = id
+                            self.orders[pair][book_side][i] = order
+                            del self.order_index[id]
+                            self.order_index[order['id']] = (pair, book_side, i)
+                            self.mark_dirty(pairs=[pair])
+                            self.publish(pair=pair, orders=True)
+                            notify = True
                         if old is not None:
                             if ('type' in order) and (order['type'] != 'margin'):
                                 self.update_balance(order, old_order=old, from_trade=from_trade, fee_asset=fee_asset, absolute_fee=absolute_fee)
@@ -234,28 +504,47 @@ class Account:
                                 self.update_position(order, old)
                 except Exception as e:
                     print ('update_order', str(e))
-                self.order_lock.release()
             else:
-                notify = self.remove_order(order, from_trade=from_trade)
+                notify = self.write_remove_order(order, from_trade=from_trade)
         return notify
 
     def remove_order(self, order, from_trade=False, fee_asset=None, absolute_fee=0):
+        notify = False
+        self.submit_lock.acquire()
+        try:
+            if isinstance(order, dict) and ('pair' in order) and (self.order_sides is not None):
+                location = (order['pair'], 'bid' if order['side'] == 'buy' else 'ask')
+                if self.order_sides.get(order['id']) == location:
+                    del self.order_sides[order['id']]
+                    notify = True
+            self.execute(self.write_remove_order, order, from_trade=from_trade, fee_asset=fee_asset, absolute_fee=absolute_fee)
+        except Exception as e:
+            print ('remove_order', str(e))
+        finally:
+            self.submit_lock.release()
+        return notify
+
+    def write_remove_order(self, order, from_trade=False, fee_asset=None, absolute_fee=0):
         notify = False
         if isinstance(order, dict) and ('pair' in order):
             pair = order['pair']
-            self.order_lock.acquire()
             try:
-                i = 0
                 old = None
                 book_side = 'bid' if order['side'] == 'buy' else 'ask'
                 if pair in self.orders:
-                    for o in self.orders[pair][book_side]:
-                        if o['id'] == order['id']:
-                            old = o.copy()
-                            break
-                        i += 1
-                    if old is not None:
-                        del self.orders[pair][book_side][i]
+                    i = self.find_order(order['id'], pair, book_side)
+                    if i is not None:
+                        orders = self.orders[pair][book_side]
+                        old = orders[i].copy()
+                        # Remove trocando pela ultima ordem do lado, sem deslocar
+                        # a lista. A ordem das ordens no lado nao e preservada
+                        last = orders.pop()
+                        if i < len(orders):
+                            orders[i] = last
+                            self.order_index[last['id']] = (pair, book_side, i)
+                        del self.order_index[order['id']]
+                        self.mark_dirty(pairs=[pair])
+                        self.publish(pair=pair, orders=True)
                         # gc.collect()
                         notify = True
                         if ('type' in order) and (order['type'] != 'margin'):
@@ -264,35 +553,83 @@ class Account:
                             self.update_position(order, old)
             except Exception as e:
                 print ('remove_order', str(e))
-            self.order_lock.release()
         return notify
 
     def get_order(self, id):
+        self.sync()
         order = {}
-        self.order_lock.acquire()
+        orders = self.snapshot['orders']
         try:
-            for pair in self.orders:
-                for book_side in self.orders[pair]:
-                    for o in self.orders[pair][book_side]:
+            location = self.order_index.get(id)
+            if (location is not None) and (orders is not None) and (location[0] in orders):
+                pair, book_side, i = location
+                side_orders = orders[pair][book_side]
+                if (i < len(side_orders)) and (side_orders[i]['id'] == id):
+                    order = side_orders[i].copy()
+                else:
+                    # O indice pode estar a frente da versao publicada
+                    for o in side_orders:
                         if o['id'] == id:
                             order = o.copy()
                             break
         except Exception as e:
             print ('get_order', str(e))
-        self.order_lock.release()
         return order
 
     def get_orders(self, pair, side):
         orders = []
-        if pair in self.orders:
+        snapshot = self.snapshot['orders']
+        if (snapshot is not None) and (pair in snapshot):
             book_side = side
             if book_side == 'buy':
                 book_side = 'bid'
             elif book_side == 'sell':
                 book_side = 'ask'
-            orders = self.orders[pair][book_side]
+            orders = snapshot[pair][book_side]
         return orders
 
+    # Dirty tracking -----------------------------------------------------------
+    def mark_dirty(self, pairs=[], currencies=[]):
+        """ Marca pares e moedas alterados desde a ultima conferencia com a
+            exchange
+
+            Args:
+                pairs (list): Pares com ordens ou posicao alteradas
+                currencies (list): Moedas com saldo alterado
+        """
+        self.dirty_lock.acquire()
+        self.dirty_pairs.update(pairs)
+        self.dirty_currencies.update(currencies)
+        self.dirty_lock.release()
+
+    def take_dirty(self, sweep=0):
+        """ Retorna e limpa os pares e moedas alterados desde a ultima
+            chamada, mais os proximos 'sweep' pares e moedas conhecidos em
+            rodizio, para que tudo seja conferido de tempos em tempos
+
+            Args:
+                sweep (int): Numero de pares e de moedas do rodizio incluidos
+            Returns:
+                (tuple): Lista de pares e lista de moedas a conferir
+        """
+        self.dirty_lock.acquire()
+        pairs = self.dirty_pairs
+        currencies = self.dirty_currencies
+        self.dirty_pairs = set()
+        self.dirty_currencies = set()
+        self.dirty_lock.release()
+        if sweep > 0:
+            snapshot = self.snapshot
+            known = sorted(set(snapshot['orders'] or {}) | set(snapshot['position'] or {}))
+            for i in range(min(sweep, len(known))):
+                pairs.add(known[(self.sweep_pairs + i) % len(known)])
+            self.sweep_pairs = (self.sweep_pairs + sweep) % max(1, len(known))
+            known = sorted(snapshot['balance'] or {})
+            for i in range(min(sweep, len(known))):
+                currencies.add(known[(self.sweep_currencies + i) % len(known)])
+            self.sweep_currencies = (self.sweep_currencies + sweep) % max(1, len(known))
+        return sorted(pairs), sorted(currencies)
+
     # Validations --------------------------------------------------------------
     def is_different_enough(self, internal, external):
         if ((internal == 0) and (external != 0)) or ((internal != 0) and (external == 0)):
@@ -302,63 +639,86 @@ class Account:
         else:
             return False
 
-    def validate_position(self, position):
+    def validate_position(self, position, pairs=None):
         errors = set()
         if position is not None:
-            internal_position = deepcopy(self.position)
+            internal_position = self.snapshot['position']
             if internal_position is not None:
-                for pair in internal_position:
-                    if (pair not in position) or self.is_different_enough(internal_position[pair], position[pair]):
+                for pair in (internal_position if pairs is None else pairs):
+                    if (pair in internal_position) and ((pair not in position) or self.is_different_enough(internal_position[pair], position[pair])):
                         errors = errors | {pair}
-                for pair in position:
-                    if (pair not in internal_position) or self.is_different_enough(internal_position[pair], position[pair]):
+                for pair in (position if pairs is None else pairs):
+                    if (pair in position) and ((pair not in internal_position) or self.is_different_enough(internal_position[pair], position[pair])):
                         errors = errors | {pair}
         return list(errors)
 
-    def validate_balance(self, balance):
+    def validate_balance(self, balance, currencies=None):
         errors = set()
         if balance is not None:
-            internal_balance = deepcopy(self.balance)
+            internal_balance = self.snapshot['balance']
             if internal_balance is not None:
-                for currency in internal_balance:
-                    internal_available = internal_balance[currency]['available']
-                    internal_reserved = internal_balance[currency]['reserved']
-                    external_available = balance[currency]['available']
-                    external_reserved = balance[currency]['reserved']
+                for currency in (set(internal_balance) | set(balance) if currencies is None else currencies):
+                    if (currency not in internal_balance) and (currency not in balance):
+                        continue
                     if ((currency not in balance)
-                        or self.is_different_enough(internal_available, external_available)
-                        or self.is_different_enough(internal_reserved, external_reserved)):
-                        errors = errors | {currency}
-                for currency in balance:
-                    if ((currency not in internal_balance)
-                        or self.is_different_enough(internal_available, external_available)
-                        or self.is_different_enough(internal_reserved, external_reserved)):
+                        or (currency not in internal_balance)
+                        or self.is_different_enough(internal_balance[currency]['available'], balance[currency]['available'])
+                        or self.is_different_enough(internal_balance[currency]['reserved'], balance[currency]['reserved'])):
                         errors = errors | {currency}
         return list(errors)
 
-    def validate_orders(self, orders_list):
-        errors = set()
-        if orders_list is not None:
-            internal_orders = deepcopy(self.orders)
-            if internal_orders is not None:
-                # Standard to list ---------------------------------------------
-                internal_orders_list = []
-                for pair in internal_orders:
-                    for book_side in internal_orders[pair]:
-                        internal_orders_list += internal_orders[pair][book_side]
-                # Compare ID ---------------------------------------------------
-                internal_id_list = [o['id'] for o in internal_orders_list]
-                id_list = [o['id'] for o in orders_list]
-                for order in orders_list:
-                    if order['id'] not in internal_id_list:
-                        errors = errors | {order['pair']}
-                for order in internal_orders_list:
-                    if order['id'] not in id_list:
-                        errors = errors | {order['pair']}
-                # Compare Quantity and Price -----------------------------------
-                for order1 in orders_list:
-                    for order2 in internal_orders_list:
-                        if order1['id'] == order2['id']:
-                            if (order1['price'] != order2['price']) or self.is_different_enough(order1['quantity'], order2['quantity']):
-                                errors = errors | {order['pair']}
-        return list(errors)
+    def reconcile_orders(self, orders_list, pairs=None):
+        """ Compara as ordens abertas na exchange com as ordens internas por
+            juncao em dicionarios indexados por id, em tempo linear
+
+            Args:
+                orders_list (list): Ordens abertas na exchange no formato padrao
+                pairs (list): Se informado, compara apenas estes pares. Ordens
+                    da exchange em pares sem nenhum registro na conta sao
+                    sempre comparadas
+            Returns:
+                (dict): Diferencas encontradas: 'missing' (ordens da exchange que
+                    nao estao na conta), 'extra' (ordens da conta que nao estao na
+                    exchange), 'mismatched' (lista de {'id', 'pair', 'fields'},
+                    onde 'fields' leva {campo: (interno, externo)} para preco e
+                    quantidade divergentes) e 'pairs' (pares afetados)
+        """
+        diff = {'missing': [], 'extra': [], 'mismatched': [], 'pairs': []}
+        internal_orders = self.snapshot['orders']
+        if (orders_list is None) or (internal_orders is None):
+            return diff
+        selected = internal_orders if pairs is None else [pair for pair in pairs if pair in internal_orders]
+        internal = {}
+        for pair in selected:
+            for book_side in internal_orders[pair]:
+                for order in internal_orders[pair][book_side]:
+                    internal[order['id']] = order
+        if pairs is None:
+            external = {order['id']: order for order in orders_list}
+        else:
+            pairs = set(pairs)
+            external = {order['id']: order for order in orders_list if (order['pair'] in pairs) or (order['pair'] not in internal_orders)}
+        pairs = set()
+        for id in external:
+            order = external[id]
+            if id not in internal:
+                diff['missing'] += [order]
+                pairs.add(order['pair'])
+                continue
+            fields = {}
+            if order['price'] != internal[id]['price']:
+                fields['price'] = (internal[id]['price'], order['price'])
+            if self.is_different_enough(internal[id]['quantity'], order['quantity']):
+                fields['quantity'] = (internal[id]['quantity'], order['quantity'])
+            if fields != {}:
+                diff['mismatched'] += [{'id': id, 'pair': order['pair'], 'fields': fields}]
+                pairs.add(order['pair'])
+        for id in internal:
+            if id not in external:
+                diff['extra'] += [internal[id]]
+                pairs.add(internal[id]['pair'])
+        diff['pairs'] = list(pairs)
+        return diff
+
+    def validate_orders(self, orders_list, pairs=None):
+        return self.reconcile_orders(orders_list, pairs=pairs)['pairs']
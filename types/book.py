@@ -0,0 +1,128 @@
+from bisect import bisect_left
+
+
+class BookSide(dict):
+    """ Um lado do book no formato {P1: Q1, P2: Q2 ...}, onde Pn e o preco em
+        ticks inteiros e Qn a quantidade em unidades inteiras. Alem do
+        dicionario, mantem a lista dos precos em ordem crescente, atualizada
+        por busca binaria a cada insercao ou remocao de linha, de modo que o
+        topo e os N melhores niveis sao lidos sem percorrer o book inteiro. """
+    def __init__(self, side, levels=None):
+        """ Inicializacao da classe
+
+            Args:
+                side (str): Lado do book ('bid' ou 'ask'). No bid o melhor preco
+                    e o maior, no ask e o menor
+                levels (dict): Linhas iniciais no formato {P1: Q1, P2: Q2 ...}
+        """
+        dict.__init__(self)
+        self.side = side
+        self.prices = []
+        if levels is not None:
+            for price in levels:
+                self[price] = levels[price]
+
+    def __reduce__(self):
+        return (self.__class__, (self.side, dict(self)))
+
+    def __setitem__(self, price, quantity):
+        if not dict.__contains__(self, price):
+            self.prices.insert(bisect_left(self.prices, price), price)
+        dict.__setitem__(self, price, quantity)
+
+    def __delitem__(self, price):
+        dict.__delitem__(self, price)
+        del self.prices[bisect_left(self.prices, price)]
+
+    def pop(self, price, *default):
+        if dict.__contains__(self, price):
+            quantity = dict.__getitem__(self, price)
+            del self[price]
+            return quantity
+        return dict.pop(self, price, *default)
+
+    def update(self, *args, **kwargs):
+        levels = dict(*args, **kwargs)
+        for price in levels:
+            self[price] = levels[price]
+
+    def clear(self):
+        dict.clear(self)
+        self.prices = []
+
+    def rank(self, price):
+        """ Posicao que o preco ocupa, ou ocuparia, contando a partir do
+            melhor nivel
+
+            Args:
+                price (int): Preco em ticks
+            Returns:
+                (int): 0 para o melhor nivel
+        """
+        i = bisect_left(self.prices, price)
+        if self.side == 'bid':
+            return len(self.prices) - i - (1 if dict.__contains__(self, price) else 0)
+        return i
+
+    def best(self):
+        """ Retorna o melhor preco do lado
+
+            Returns:
+                (int): Melhor preco em ticks ou None se o lado estiver vazio
+        """
+        if self.prices == []:
+            return None
+        return self.prices[-1] if self.side == 'bid' else self.prices[0]
+
+    def top(self, n=None):
+        """ Retorna os N melhores niveis do lado
+
+            Args:
+                n (int): Numero de niveis. Se None, retorna todos
+            Returns:
+                (list): Lista de tuplas (preco, quantidade) do melhor para o
+                    pior preco
+        """
+        if self.side == 'bid':
+            prices = self.prices[::-1] if n is None else self.prices[:-n - 1:-1]
+        else:
+            prices = self.prices if n is None else self.prices[:n]
+        return [(price, dict.__getitem__(self, price)) for price in prices]
+
+
+class BookView:
+    """ Versao publicada e imutavel de um book. Guarda uma copia dos precos em
+        ticks e das quantidades em unidades inteiras feita no momento da
+        publicacao, com o tick e a unidade da mesma versao. A conversao para
+        float so e feita na primeira leitura e fica guardada na propria
+        versao, de modo que os leitores nunca esperam pela thread de book. """
+    def __init__(self, sides, tick, unit):
+        """ Inicializacao da classe
+
+            Args:
+                sides (dict): Lados do book {'bid': BookSide, 'ask': BookSide}
+                tick (Fraction): Tamanho do tick dos precos
+                unit (int): Unidades inteiras em uma unidade de quantidade
+        """
+        self.sides = {book_side: (list(sides[book_side].prices), dict(sides[book_side])) for book_side in sides}
+        self.tick = tick
+        self.unit = unit
+        self.book = None
+        self.arrays = None
+
+    def get(self):
+        """ Retorna o book em float, montado uma unica vez
+
+            Returns:
+                (dict): Dicionario {'bid': {preco: quantidade}, 'ask': {...}}
+                    do melhor para o pior preco. Nao deve ser alterado
+        """
+        if self.book is None:
+            book = {}
+            numerator, denominator = self.tick.numerator, self.tick.denominator
+            for book_side in self.sides:
+                prices, levels = self.sides[book_side]
+                prices = reversed(prices) if book_side == 'bid' else prices
+                book[book_side] = {price * numerator / denominator: levels[price] / self.unit for price in prices}
+            self.book = book
+        return self.book
@@ -0,0 +1,150 @@
+from collections import deque
+
+
+class CandleSeries:
+    """ Candles OHLCV de um par em uma resolucao, montados trade a trade a
+        partir do websocket. O indice de cada candle e o timestamp, em
+        segundos, do seu fechamento. Minutos sem trades geram candles sem
+        volume com o preco do fechamento anterior, para que a serie nao tenha
+        buracos. """
+    def __init__(self, pair, resolution=60, size=1440):
+        """ Inicializacao da classe
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                resolution (int): Duracao de cada candle em segundos
+                size (int): Numero maximo de candles fechados mantidos
+        """
+        self.pair = pair
+        self.resolution = resolution
+        self.size = size
+        self.candles = deque(maxlen=size)
+        self.current = None
+        self.first = None
+        self.live_since = None
+
+    def new_candle(self, index, price, quantity=0.0, trades=0):
+        return {'pair': self.pair,
+                'resolution': self.resolution,
+                'index': index,
+                'open': price,
+                'high': price,
+                'low': price,
+                'close': price,
+                'volume': quantity,
+                'quote_volume': price * quantity,
+                'trades': trades}
+
+    def add_trade(self, timestamp, price, quantity):
+        """ Atualiza o candle corrente com um trade
+
+            Args:
+                timestamp (float): Timestamp do trade em segundos
+                price (float): Preco
+                quantity (float): Quantidade
+            Returns:
+                (list): Candles fechados por este trade, do mais antigo para o
+                    mais novo
+        """
+        index = int(self.resolution * (timestamp // self.resolution)) + self.resolution
+        closed = []
+        if self.current is None:
+            self.current = self.new_candle(index, price, quantity, 1)
+            # O primeiro candle comecou no meio, o primeiro completo e o proximo
+            self.first = self.current
+            self.live_since = index + self.resolution
+        elif index == self.current['index']:
+            candle = self.current
+            candle['high'] = max(candle['high'], price)
+            candle['low'] = min(candle['low'], price)
+            candle['close'] = price
+            candle['volume'] += quantity
+            candle['quote_volume'] += price * quantity
+            candle['trades'] += 1
+        elif index > self.current['index']:
+            if self.current['index'] >= self.live_since:
+                closed += [self.current]
+            gap = (index - self.current['index']) // self.resolution - 1
+            for i in range(max(0, gap - self.size), gap):
+                closed += [self.new_candle(self.current['index'] + (i + 1) * self.resolution, self.current['close'])]
+            self.candles.extend(closed)
+            self.current = self.new_candle(index, price, quantity, 1)
+        return closed
+
+    def from_rest(self, raw_candle):
+        candle = self.new_candle(int(raw_candle['index']), raw_candle['close'])
+        for key in ['open', 'high', 'low', 'volume', 'quote_volume', 'trades']:
+            if key in raw_candle:
+                candle[key] = raw_candle[key]
+        return candle
+
+    def merge_first(self, candle, raw_candle):
+        """ Completa o primeiro candle do websocket, que comecou no meio, com
+            o candle REST do mesmo periodo. A abertura vem do REST e o
+            fechamento do websocket; volume e numero de trades ficam com o
+            maior dos dois, pois ambos sao parciais """
+        rest = self.from_rest(raw_candle)
+        candle['open'] = rest['open']
+        candle['high'] = max(candle['high'], rest['high'])
+        candle['low'] = min(candle['low'], rest['low'])
+        for key in ['volume', 'quote_volume', 'trades']:
+            candle[key] = max(candle[key], rest[key])
+        return candle
+
+    def backfill(self, candles, now=None):
+        """ Completa o historico com candles obtidos por REST. Apenas os candles
+            anteriores ao primeiro candle completo montado pelo websocket sao
+            usados. Candles REST ainda abertos no momento da consulta nao sao
+            guardados como fechados: o do primeiro candle do websocket e
+            combinado com ele e os demais sao descartados
+
+            Args:
+                candles (list): Candles no mesmo formato de indice, do mais
+                    antigo para o mais novo. Campos ausentes sao preenchidos com
+                    o fechamento
+                now (float): Timestamp em segundos da consulta REST. Se None,
+                    todos os candles sao tratados como fechados
+        """
+        first = self.first['index'] if self.first is not None else None
+        live = [c for c in self.candles if (self.live_since is not None) and (c['index'] >= self.live_since)]
+        older = []
+        for raw_candle in candles:
+            index = int(raw_candle['index'])
+            closed = (now is None) or (index <= now)
+            if (first is None) or (index < first):
+                if closed:
+                    older += [self.from_rest(raw_candle)]
+            elif (index == first) and (self.live_since > first):
+                if self.first is self.current:
+                    # Ainda aberto no websocket: e guardado quando fechar
+                    self.merge_first(self.current, raw_candle)
+                    self.live_since = first
+                elif closed:
+                    older += [self.from_rest(raw_candle)]
+                else:
+                    older += [self.merge_first(dict(self.first), raw_candle)]
+        self.candles = deque(older + live, maxlen=self.size)
+
+    def get(self, window, now=None):
+        """ Retorna os ultimos candles fechados
+
+            Args:
+                window (int): Numero de candles
+                now (float): Se informado, exige que o candle corrente ainda
+                    esteja aberto neste instante. Sem trades recentes o ultimo
+                    fechamento nao e conhecido e a serie nao e usada
+            Returns:
+                (list): Candles do mais antigo para o mais novo, ou None se a
+                    serie ainda nao tiver candles contiguos suficientes
+        """
+        if len(self.candles) < window:
+            return None
+        if (now is not None) and ((self.current is None) or (now >= self.current['index'])):
+            return None
+        candles = list(self.candles)[-window:]
+        for i in range(1, len(candles)):
+            if candles[i]['index'] - candles[i - 1]['index'] != self.resolution:
+                return None
+        if (self.current is not None) and (candles != []) and (self.current['index'] - candles[-1]['index'] != self.resolution):
+            return None
+        return candles
@@ -0,0 +1,70 @@
+from collections.abc import Mapping
+from threading import Lock
+# Asimov -----------------------------------------------------------------------
+from .utils import codec
+
+
+class Notification(Mapping):
+    """ Visao imutavel de um evento emitido pela interface. O estado e
+        serializado para JSON uma unica vez e apenas quando alguem le o
+        atributo 'json'. O frame original da exchange fica em 'raw', fora do
+        estado, e nunca e recodificado. """
+    __slots__ = ('_state', '_message', '_lock', 'raw')
+
+    def __init__(self, state, raw=''):
+        """ Inicializacao da classe
+
+            Args:
+                state (dict): Estado do evento montado por Exchange.notify
+                raw (str/bytes): Frame original que gerou o evento
+        """
+        object.__setattr__(self, '_state', state)
+        object.__setattr__(self, 'raw', raw)
+        object.__setattr__(self, '_message', None)
+        object.__setattr__(self, '_lock', Lock())
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Notification is immutable')
+
+    def __getitem__(self, key):
+        return self._state[key]
+
+    def __iter__(self):
+        return iter(self._state)
+
+    def __len__(self):
+        return len(self._state)
+
+    def __repr__(self):
+        return 'Notification({})'.format(self._state)
+
+    @property
+    def event(self):
+        return self._state['event']
+
+    @property
+    def update(self):
+        return self._state['update']
+
+    @property
+    def sequence(self):
+        return self._state['sequence']
+
+    @property
+    def json(self):
+        """ Retorna o evento serializado, codificando apenas na primeira leitura
+
+            Returns:
+                (str): Estado do evento em JSON
+        """
+        if self._message is None:
+            self._lock.acquire()
+            try:
+                if self._message is None:
+                    object.__setattr__(self, '_message', codec.dumps(self._state))
+            finally:
+                self._lock.release()
+        return self._message
+
+    def to_dict(self):
+        return dict(self._state)
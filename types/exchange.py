@@ -7,18 +7,31 @@ import gc
 import pandas as pd
 from queue import Queue
 from datetime import datetime, timedelta, timezone
-from time import sleep, time
+from time import sleep, time, perf_counter_ns
 from threading import Thread, Event, Lock, Semaphore
 from decimal import Decimal as D
+from fractions import Fraction
+from math import floor
 # Asimov -----------------------------------------------------------------------
+from ..connectors.book_engine import BookEngine
+from ..connectors.book_sync import BookSync
+from ..connectors.conflator import Conflator
+from ..connectors.dispatcher import Dispatcher
 from .utils.utils import *
 from .account import Account
+from .event import Notification
+from .histogram import record_latency
 from .marketdata import MarketData
 
+ORDER_EVENTS = ['buy', 'sell', 'place', 'replace', 'cancel']
+MARKETDATA_EVENTS = ['trade', 'book', 'quote', 'candle']
+
+
 class Exchange:
-    def __init__(self, subscriber=None, blueprint={}, filter=None, logger=None, quick=True, hot=False, book_depth=False, tolerance=0.005/100, no_poll=False):
+    def __init__(self, subscriber=None, blueprint={}, filter=None, logger=None, quick=True, hot=False, book_depth=False, tolerance=0.005/100, no_poll=False, delta=False, dispatch=None, conflation=None, journal=None, depth=None, tape=10000, candles=[60]):
         self.name = self.get_name()
         self.logger = logger if logger is not None else DummyLogger(self.name)
+        self.journal = journal
         # Base Parameters ------------------------------------------------------
         self.blueprint = blueprint
         # Aditional Parameters -------------------------------------------------
@@ -26,16 +39,39 @@ class Exchange:
         self.hot = hot
         self.book_depth = book_depth
         self.tolerance = tolerance
+        self.delta = delta
         # Subscription ---------------------------------------------------------
         self.notification_filters = []
+        self.notification_deltas = []
+        self.notification_structured = []
+        self.notification_raw = []
+        self.notification_latency = []
+        self.dispatchers = []
         self.subscribers = []
         self.n = 0
+        self.sequence = 0
+        self.routes = {}
+        self.default_routes = {}
         self.sub_lock = Lock()
-        self.subscribe(subscriber, filter=filter, notify=False)
+        self.dispatch_lock = Lock()
+        # Instrumentation ------------------------------------------------------
+        self.instrument = True
+        self.latency = {'routing': {}, 'state': {}, 'serialization': {}}
+        self.conflator = Conflator(self.emit, conflation) if conflation else None
+        self.subscribe(subscriber, filter=filter, notify=False, dispatch=dispatch)
         # Data -----------------------------------------------------------------
         self.info = {}
         self.marketdata = MarketData()
+        self.marketdata.set_depth(depth)
+        self.marketdata.set_tape_capacity(tape)
+        self.marketdata.set_candle_resolutions(candles)
+        self.book_sync = BookSync(self.marketdata, self.get_book_snapshot)
+        self.book_levels = None
+        self.book_engine = None
         self.account = Account()
+        self.verify_count = 0
+        self.verify_sweep = 6
+        self.filters = {}
         # Rate Limit -----------------------------------------------------------
         self.placement_count = {}
         self.rate_limit = self.get_rate_limit()
@@ -95,16 +131,126 @@ class Exchange:
                 break
             sleep(5)
 
-    def subscribe(self, subscriber, filter=None, notify=True):
+    def subscribe(self, subscriber, filter=None, notify=True, delta=None, structured=False, dispatch=None, queue_size=1000, raw=False):
+        """ Inscreve uma funcao para receber as notificacoes da interface
+
+            Args:
+                subscriber (callable): Funcao que recebera as notificacoes
+                filter (dict): Eventos e pares de interesse
+                notify (bool): Se emite o evento 'subscription' em seguida
+                delta (bool): Se recebe apenas os objetos alterados pelo evento.
+                    Se None, usa o padrao da interface
+                structured (bool): Se recebe o objeto Notification em vez do
+                    JSON. O frame original fica em Notification.raw
+                dispatch (str): Politica da fila de entrega assincrona. Se
+                    None, a funcao e chamada na thread que gerou o evento
+                queue_size (int): Tamanho da fila de entrega assincrona
+                raw (bool): Se a funcao, em modo JSON, deve ser chamada com
+                    (mensagem, frame original), sem recodificar o frame
+        """
         if callable(subscriber):
+            dispatcher = None
+            if dispatch is not None:
+                dispatcher = Dispatcher(subscriber, size=queue_size, policy=dispatch, structured=structured, raw=raw)
             self.sub_lock.acquire()
             self.notification_filters += [filter]
+            self.notification_deltas += [self.delta if delta is None else delta]
+            self.notification_structured += [structured]
+            self.notification_raw += [raw]
+            self.notification_latency += [dispatcher.latency if dispatcher is not None else {}]
+            self.dispatchers += [dispatcher]
             self.subscribers += [subscriber]
             self.n += 1
+            self.build_routes()
             self.sub_lock.release()
             if notify:
                 self.notify('subscription')
 
+    def unsubscribe(self, subscriber):
+        """ Remove um assinante e todas as suas rotas
+
+            Args:
+                subscriber (callable): Funcao passada anteriormente a subscribe
+            Returns:
+                (bool): Se o assinante foi encontrado
+        """
+        self.sub_lock.acquire()
+        keep = [i for i in range(self.n) if self.subscribers[i] != subscriber]
+        found = len(keep) != self.n
+        for i in range(self.n):
+            if (i not in keep) and (self.dispatchers[i] is not None):
+                self.dispatchers[i].close()
+        self.notification_filters = [self.notification_filters[i] for i in keep]
+        self.notification_deltas = [self.notification_deltas[i] for i in keep]
+        self.notification_structured = [self.notification_structured[i] for i in keep]
+        self.notification_raw = [self.notification_raw[i] for i in keep]
+        self.notification_latency = [self.notification_latency[i] for i in keep]
+        self.dispatchers = [self.dispatchers[i] for i in keep]
+        self.subscribers = [self.subscribers[i] for i in keep]
+        self.n = len(keep)
+        self.build_routes()
+        self.sub_lock.release()
+        return found
+
+    def build_routes(self):
+        """ Compila os filtros dos assinantes em um indice (evento, par) ->
+            assinantes. Deve ser chamada com sub_lock adquirido. """
+        routes = {}
+        for i in range(self.n):
+            filter = self.notification_filters[i]
+            if filter is not None:
+                for event in MARKETDATA_EVENTS:
+                    if event in filter:
+                        for pair in filter[event]:
+                            routes.setdefault((event, pair), []).append(i)
+                if 'account' in filter:
+                    for event in ORDER_EVENTS + ['rate-limit']:
+                        if event not in filter:
+                            for pair in filter['account']:
+                                routes.setdefault((event, pair), []).append(i)
+        self.routes = routes
+        self.default_routes = {}
+
+    def get_default_route(self, event):
+        """ Assinantes que recebem o evento independentemente do par """
+        if event not in self.default_routes:
+            route = []
+            for i in range(self.n):
+                filter = self.notification_filters[i]
+                if (filter is None) or (event == 'subscription'):
+                    route += [i]
+                elif (event not in filter) and ('account' in filter) and (event not in ORDER_EVENTS + ['rate-limit']):
+                    route += [i]
+            self.default_routes[event] = route
+        return self.default_routes[event]
+
+    def route_notification(self, event, update):
+        """ Seleciona os assinantes de um evento pelo indice de rotas, com o
+            mesmo resultado de filter_notification
+
+            Returns:
+                (list): Indices dos assinantes em ordem de inscricao
+        """
+        route = self.get_default_route(event)
+        pairs = []
+        if isinstance(update, dict):
+            if event in ['book', 'quote']:
+                pairs = update
+            elif event == 'rate-limit':
+                if ('inputs' in update) and ('pair' in update['inputs']):
+                    pairs = [update['inputs']['pair']]
+            elif 'pair' in update:
+                pairs = [update['pair']]
+        matched = None
+        for pair in pairs:
+            if (event, pair) in self.routes:
+                if matched is None:
+                    matched = set(route)
+                matched.update(self.routes[(event, pair)])
+        if matched is None:
+            return route
+        return sorted(matched)
+
     def filter_notification(self, state, filter):
         if (filter is None) or (state['event'] == 'subscription'):
             return True
@@ -112,7 +258,7 @@ class Exchange:
             event = state['event']
             update = state['update']
             if event in filter:
-                if event == 'trade':
+                if event in ['trade', 'candle']:
                     if update['pair'] in filter[event]:
                         return True
                 elif (event == 'book') or (event == 'quote'):
@@ -133,39 +279,230 @@ class Exchange:
                     return True
             return False
 
+    def get_delta(self, event, update):
+        """ Monta apenas os objetos de estado alterados pelo evento
+
+            Args:
+                event (str): Nome do evento
+                update (dict): Atualizacao carregada pelo evento
+            Returns:
+                (dict): Dicionario com as partes de 'account' e 'marketdata'
+                    tocadas pelo evento
+        """
+        account = {}
+        marketdata = {}
+        data = self.account.get_data()
+        if event == 'balance':
+            account['balance'] = data['balance']
+        elif event == 'position':
+            account['position'] = data['position']
+            account['position_base'] = data['position_base']
+        elif event in ['orders', 'reset']:
+            account['orders'] = data['orders']
+        elif (event in ORDER_EVENTS) and isinstance(update, dict) and ('pair' in update):
+            pair = update['pair']
+            if data['orders'] is not None:
+                account['orders'] = {pair: data['orders'].get(pair)}
+            if data['balance'] is not None:
+                account['balance'] = {c: data['balance'][c] for c in pair.split('/') if c in data['balance']}
+            if data['position'] is not None:
+                account['position'] = {pair: data['position'].get(pair)}
+        elif (event == 'trade') and isinstance(update, dict) and ('pair' in update):
+            pair = update['pair']
+            snapshot = self.marketdata.get_data()
+            for key in ['last', 'last_buy', 'last_sell']:
+                marketdata[key] = {pair: snapshot[key].get(pair)}
+        elif event in ['book', 'quote']:
+            snapshot = self.marketdata.get_data()
+            if isinstance(update, dict):
+                pairs = list(update)
+            else:
+                pairs = list(snapshot['bid'])
+            for key in ['bid', 'ask', 'bid_quantity', 'ask_quantity']:
+                marketdata[key] = {pair: snapshot[key][pair] for pair in pairs if pair in snapshot[key]}
+        return {'account': account, 'marketdata': marketdata}
+
+    def build_state(self, header, delta):
+        state = dict(header)
+        if delta:
+            state['delta'] = self.get_delta(header['event'], header['update'])
+        else:
+            state['account'] = self.account.get_data()
+            state['marketdata'] = self.marketdata.get_data(book=True)
+            state['info'] = self.info
+        return state
+
+    def get_snapshot(self):
+        """ Retorna o estado completo da interface, para assinantes em modo
+            delta que precisem se ressincronizar
+
+            Returns:
+                (dict): Estado completo com o numero de sequencia do ultimo
+                    evento emitido
+        """
+        header = {'timestamp': time(),
+                  'exchange': self.name,
+                  'event': 'snapshot',
+                  'update': None,
+                  'from': None,
+                  'elapsed': None,
+                  'sequence': self.sequence}
+        return self.build_state(header, False)
+
+    def get_notification_key(self, event, update):
+        """ Chave (evento, par) usada para conflacionar notificacoes """
+        if isinstance(update, dict):
+            if 'pair' in update:
+                return (event, update['pair'])
+            elif event in ['book', 'quote']:
+                return (event, tuple(sorted(update)))
+        return (event, None)
+
+    def get_dispatch_stats(self):
+        """ Retorna os contadores das filas de entrega assincrona
+
+            Returns:
+                (list): Um dicionario por assinante com fila propria, contendo
+                    profundidade da fila e contadores de descarte
+        """
+        stats = []
+        for i in range(self.n):
+            if self.dispatchers[i] is not None:
+                d = self.dispatchers[i].get_stats()
+                d['subscriber'] = str(self.subscribers[i])
+                stats += [d]
+        return stats
+
+    def get_latency_stats(self):
+        """ Retorna os histogramas de latencia do caminho de notificacao, em
+            microssegundos
+
+            Returns:
+                (dict): Resumos por evento do roteamento ('routing'), da
+                    montagem do estado ('state'), da serializacao
+                    ('serialization') e de cada assinante ('subscribers'). Para
+                    assinantes com fila propria, o tempo e medido na thread de
+                    entrega
+        """
+        stats = {}
+        for stage in self.latency:
+            stats[stage] = {event: h.get_summary() for event, h in list(self.latency[stage].items())}
+        stats['subscribers'] = []
+        for i in range(self.n):
+            stats['subscribers'] += [{'subscriber': str(self.subscribers[i]),
+                                      'dispatch': self.dispatchers[i] is not None,
+                                      'events': {event: h.get_summary() for event, h in list(self.notification_latency[i].items())}}]
+        return stats
+
+    def reset_latency_stats(self):
+        for stage in self.latency:
+            self.latency[stage].clear()
+        for histograms in self.notification_latency:
+            histograms.clear()
+
     def notify(self, event, update=None, source=None, elapsed=None, raw=''):
         if event is not None:
-            state = {'timestamp': time(),
-                     'exchange': self.name,
-                     'event': event,
-                     'update': update,
-                     'from': source,
-                     'elapsed': elapsed,
-                     'account': self.account.get_data(),
-                     'marketdata': self.marketdata.get_data(),
-                     'info': self.info,
-                     'raw': raw}
-            message = json.dumps(state)
-
+            # Alteracoes da conta sao enfileiradas sem espera; o estado
+            # notificado precisa refleti-las
+            if event not in MARKETDATA_EVENTS:
+                self.account.sync()
+            if (self.conflator is None) or (not self.conflator.hold(event, update, source=source, elapsed=elapsed, raw=raw)):
+                self.emit(event, update, source=source, elapsed=elapsed, raw=raw)
+
+    def emit(self, event, update=None, source=None, elapsed=None, raw=''):
+        if event is not None:
             self.sub_lock.acquire()
+            self.sequence += 1
+            header = {'timestamp': time(),
+                      'exchange': self.name,
+                      'event': event,
+                      'update': update,
+                      'from': source,
+                      'elapsed': elapsed,
+                      'sequence': self.sequence}
+            notifications = {}
+            encoded = set()
+            key = self.get_notification_key(event, update)
+            instrument = self.instrument
+            queued = []
+            i = 0
             try:
-                i = 0
-                while i < self.n:
-                    if self.filter_notification(state, self.notification_filters[i]):
-                        self.subscribers[i](message)
-                    i += 1
+                start = perf_counter_ns()
+                route = self.route_notification(event, update)
+                if instrument:
+                    record_latency(self.latency['routing'], event, start)
+                for i in route:
+                    delta = self.notification_deltas[i] and (event != 'subscription')
+                    if delta not in notifications:
+                        start = perf_counter_ns()
+                        notifications[delta] = Notification(self.build_state(header, delta), raw=raw)
+                        if instrument:
+                            record_latency(self.latency['state'], event, start)
+                    notification = notifications[delta]
+                    if self.dispatchers[i] is not None:
+                        queued += [(self.dispatchers[i], notification)]
+                    else:
+                        if (not self.notification_structured[i]) and (delta not in encoded):
+                            start = perf_counter_ns()
+                            notification.json
+                            encoded.add(delta)
+                            if instrument:
+                                record_latency(self.latency['serialization'], event, start)
+                        start = perf_counter_ns()
+                        if self.notification_structured[i]:
+                            self.subscribers[i](notification)
+                        elif self.notification_raw[i]:
+                            self.subscribers[i](notification.json, raw)
+                        else:
+                            self.subscribers[i](notification.json)
+                        if instrument:
+                            record_latency(self.notification_latency[i], event, start)
             except Exception as e:
                 print('NOTIFY ERROR:', str(e), '| subs:', self.subscribers[i], '| event:', event, '| filter:', self.notification_filters[i])
-            self.sub_lock.release()
-
-            if (event not in ['verify', 'subscribe']) and (self.logger is not None):
-                del state['info']
-                self.logger.log('interface', state, silenced=True)
+            # As filas sao alimentadas fora de sub_lock, para que uma fila
+            # cheia em 'block' nao segure os assinantes diretos. dispatch_lock
+            # e pego antes de soltar sub_lock e mantem as filas na ordem de
+            # sequence
+            if queued != []:
+                self.dispatch_lock.acquire()
+                self.sub_lock.release()
+                try:
+                    for dispatcher, notification in queued:
+                        dispatcher.put(notification, key=key)
+                finally:
+                    self.dispatch_lock.release()
+            else:
+                self.sub_lock.release()
+
+            # O DummyLogger padrao descarta tudo; sem diario nem logger real o
+            # estado nao e montado
+            if (event not in ['verify', 'subscribe']) and ((self.journal is not None) or (not isinstance(self.logger, DummyLogger))):
+                state = notifications[self.delta] if self.delta in notifications else self.build_state(header, self.delta)
+                state = {key: state[key] for key in state if key != 'info'}
+                state['raw'] = raw.decode('utf-8', 'replace') if isinstance(raw, (bytes, bytearray)) else raw
+                if self.journal is not None:
+                    self.journal.append(state)
+                else:
+                    self.logger.log('interface', state, silenced=True)
 
             if event == 'error':
                 tag = self.name[0].upper() + self.name[1:]
                 print(datetime.now(), '- [', tag, '] Error:', update)
 
+    def journal_raw(self, channel, message):
+        """ Registra uma mensagem crua no diario, se houver um
+
+            Args:
+                channel (str): Origem da mensagem ('account', 'marketdata'...)
+                message (str): Mensagem recebida
+        """
+        if self.journal is not None:
+            self.journal.append({'timestamp': time(),
+                                 'exchange': self.name,
+                                 'event': 'raw',
+                                 'channel': channel,
+                                 'raw': message})
+
     # Checks -------------------------------------------------------------------
     def has_account(self):
         bp = self.blueprint
@@ -250,6 +587,85 @@ class Exchange:
     def get_info(self):
         return None
 
+    def get_candle_format(self):
+        """ Formato dos candles retornados por get_candles da exchange
+
+            Returns:
+                (dict): 'index' ('open' ou 'close', instante que indexa o
+                    candle), 'unit' (1 para segundos, 1000 para milissegundos),
+                    'descending' (se o candle mais novo vem primeiro) e,
+                    opcionalmente, 'fields' ({campo da exchange: campo padrao})
+                    para campos com significado diferente do padrao
+        """
+        return {'index': 'close', 'unit': 1, 'descending': False}
+
+    def get_book_snapshot(self, pair):
+        """ Busca o book do par por REST, usado na ressincronizacao
+
+            Returns:
+                (dict): {'bid': {P: Q}, 'ask': {P: Q}, 'sequence': int ou None,
+                    'timestamp': float ou None}
+        """
+        return None
+
+    def verify_book_checksum(self, pair, checksum):
+        return True
+
+    # Candles ------------------------------------------------------------------
+    def record_trade(self, trade, pair=None):
+        """ Grava um trade do websocket e publica os candles que ele fechou
+
+            Args:
+                trade (dict): Trade no formato padrao Asimov
+                pair (str): Par no formato padrao Asimov, quando o trade nao o
+                    traz padronizado
+        """
+        for candle in self.marketdata.record_trade(trade, pair=pair):
+            self.notify('candle', candle, source='websocket')
+
+    def get_live_candles(self, pair, window, resolution=60):
+        """ Candles montados em memoria, no formato do get_candles da
+            exchange
+
+            Returns:
+                (list): Candles ou None se a serie ainda nao estiver aquecida
+        """
+        candles = self.marketdata.get_candles(pair, window, resolution=resolution, now=time())
+        if candles is None:
+            return None
+        format = self.get_candle_format()
+        shift = resolution if format['index'] == 'open' else 0
+        candles = [dict(candle, index=(candle['index'] - shift) * format['unit']) for candle in candles]
+        for field, standard in format.get('fields', {}).items():
+            for candle in candles:
+                candle[field] = candle[standard]
+        if format['descending']:
+            candles.reverse()
+        return candles
+
+    def backfill_candles(self, pair, candles, resolution=60, now=None):
+        """ Usa os candles obtidos por REST para completar o historico em
+            memoria
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                candles (list): Retorno do get_candles da exchange
+                resolution (int): Duracao dos candles em segundos
+                now (float): Timestamp em segundos de antes da consulta REST.
+                    Candles que fecham depois dele ainda estavam abertos. Se
+                    None, usa o instante atual
+        """
+        now = time() if now is None else now
+        if isinstance(candles, list):
+            format = self.get_candle_format()
+            shift = resolution if format['index'] == 'open' else 0
+            candles = [dict(candle, index=(candle['index'] // format['unit']) + shift) for candle in candles]
+            for field, standard in format.get('fields', {}).items():
+                for candle in candles:
+                    if field in candle:
+                        candle[standard] = candle.pop(field)
+            self.marketdata.backfill_candles(pair, sorted(candles, key=lambda c: c['index']), resolution=resolution, now=now)
+
     # Virtual Composite Commands -----------------------------------------------
     def reset_orders(self, pair):
         while True:
@@ -260,7 +676,7 @@ class Exchange:
                 if (order['pair'] == pair) or (pair is None):
                     self.cancel_order(order['id'])
             self.update_open_orders(pair=pair)
-            if (pair is None) or ((pair not in self.account.orders) or ((self.account.orders[pair]['bid'] == []) and (self.account.orders[pair]['ask'] == []))):
+            if (pair is None) or (not self.account.has_open_orders(pair)):
                 break
             sleep(2)
 
@@ -268,6 +684,9 @@ class Exchange:
         info = self.get_info()
         if info is not None:
             self.info.update(info)
+            self.filters = {}
+            self.marketdata.set_filters(info)
+            self.account.set_units(info)
 
     def update_ticker(self, pair=None):
         tickers = self.get_ticker()
@@ -302,65 +721,173 @@ class Exchange:
                 if (order['pair'] == pair) or (pair is None):
                     self.cancel_order(order['id'])
             self.update_open_orders(pair)
-            if (pair is None) or ((pair not in self.account.orders) or ((self.account.orders[pair]['bid'] == []) and (self.account.orders[pair]['ask'] == []))):
+            if (pair is None) or (not self.account.has_open_orders(pair)):
                 break
             sleep(2)
 
+    def take_verification(self):
+        """ Seleciona o que conferir na proxima verificacao da conta: os pares
+            e moedas alterados desde a ultima e, a cada 'verify_sweep'
+            verificacoes, mais um par e uma moeda em rodizio
+
+            Returns:
+                (tuple): Lista de pares e lista de moedas a conferir
+        """
+        self.verify_count += 1
+        sweep = 1 if self.verify_count % self.verify_sweep == 0 else 0
+        return self.account.take_dirty(sweep=sweep)
+
     def verify_account_data(self):
-        position = self.get_position()
-        error = self.account.validate_position(position)
-        self.notify('verify', update={'position': error}, source='rest')
-        balance = self.get_balance()
-        error = self.account.validate_balance(balance)
-        self.notify('verify', update={'balance': error}, source='rest')
-        open_orders = self.get_open_orders()
-        error = self.account.validate_orders(open_orders)
-        self.notify('verify', update={'open_orders': error}, source='rest')
+        """ Confere a conta com a exchange. Consultas que falharem nao geram
+            evento 'verify' e seus pares e moedas voltam a ficar pendentes """
+        pairs, currencies = self.take_verification()
+        # Sem posicao interna (spot), get_position retorna None sempre
+        if (pairs != []) and (self.account.get_data()['position'] is not None):
+            position = self.get_position()
+            if position is None:
+                self.account.mark_dirty(pairs=pairs)
+            else:
+                error = self.account.validate_position(position, pairs=pairs)
+                self.notify('verify', update={'position': error}, source='rest')
+        if currencies != []:
+            balance = self.get_balance()
+            if balance is None:
+                self.account.mark_dirty(currencies=currencies)
+            else:
+                error = self.account.validate_balance(balance, currencies=currencies)
+                self.notify('verify', update={'balance': error}, source='rest')
+        if pairs != []:
+            open_orders = self.get_open_orders()
+            if open_orders is None:
+                self.account.mark_dirty(pairs=pairs)
+            else:
+                diff = self.account.reconcile_orders(open_orders, pairs=pairs)
+                self.notify('verify', update={'open_orders': diff['pairs'], 'open_orders_diff': diff}, source='rest')
+
+    def start_book_engine(self, shards=1):
+        """ Passa a aplicar as entradas de book de todos os pares em um
+            BookEngine, em vez de uma thread por par
+
+            Args:
+                shards (int): Numero de threads do BookEngine
+            Returns:
+                (BookEngine): Motor de book da interface
+        """
+        if self.book_engine is None:
+            self.book_engine = BookEngine(self.apply_book_batch, shards=shards)
+            self.marketdata.set_book_engine(self.book_engine)
+        return self.book_engine
 
     def book_update(self, pair):
         while True:
             if pair not in self.marketdata.book_queue:
                 self.marketdata.book_queue[pair] = Queue()
-            entry = self.marketdata.book_queue[pair].get()
-            if ('pair' in entry) and (pair == entry['pair']):
-                if ('bid' in entry) and ('ask' in entry):
-                    self.marketdata.set_book(pair, 'bid', entry['bid'])
-                    self.marketdata.set_book(pair, 'ask', entry['ask'])
+            queue = self.marketdata.book_queue[pair]
+            entries = [queue.get()]
+            while not queue.empty():
+                entries += [queue.get()]
+            self.apply_book_batch(pair, [entry for entry in entries if entry.get('pair') == pair])
+
+    def apply_book_batch(self, pair, entries):
+        """ Aplica em lote as entradas de book de um par: todas as linhas de um
+            frame e tudo o que ja estava pendente. O topo e recalculado, o book
+            publicado e a notificacao enviada uma unica vez, depois do lote
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                entries (list): Snapshots, atualizacoes de linha, checksums ou
+                    frames no formato {'pair': pair, 'entries': [...]}
+        """
+        notify = False
+        for entry in entries:
+            if 'entries' in entry:
+                frame = entry['entries']
+            else:
+                frame = [entry]
+            for item in frame:
+                if 'checksum' in item:
+                    if self.book_levels is not None:
+                        self.marketdata.truncate_book(pair, self.book_levels)
+                    if not self.verify_book_checksum(pair, item['checksum']):
+                        self.book_sync.invalidate(pair, generation=item.get('generation'))
+                elif ('bid' in item) and ('ask' in item):
+                    self.marketdata.set_book(pair, 'bid', item['bid'])
+                    self.marketdata.set_book(pair, 'ask', item['ask'])
                     notify = True
                 else:
-                    notify = self.marketdata.insert_entry(entry)
-                if notify or self.book_depth:
-                    if (pair in self.marketdata.bid) and (pair in self.marketdata.ask):
-                        update = {pair: {'bid': self.marketdata.bid[pair],
-                                         'ask': self.marketdata.ask[pair],
-                                         'bid_quantity': self.marketdata.bid_quantity[pair],
-                                         'ask_quantity': self.marketdata.ask_quantity[pair]}}
-                        event = 'book'
-                        self.notify(event, update, source='websocket')
-                        notify = False
+                    self.marketdata.insert_entry(item, update_top=False)
+        if self.book_levels is not None:
+            self.marketdata.truncate_book(pair, self.book_levels)
+        update = self.marketdata.refresh_book(pair, force=notify or self.book_depth)
+        if update is not None:
+            self.notify('book', {pair: update}, source='websocket')
 
     # Filters ------------------------------------------------------------------
-    def filter_quantity(self, pair, quantity):
-        if (quantity is not None) and (quantity > 0):
-            if pair not in self.info:
-                self.update_info()
-            if 'quantity_filter' not in self.info[pair]:
+    def get_filter(self, pair, name):
+        """ Retorna o filtro de um par ja convertido, guardado ate a proxima
+            atualizacao de info
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                name (str): 'price_filter' ou 'quantity_filter'
+            Returns:
+                (tuple): Passo como Decimal e como Fraction, o inverso do passo
+                    em float e a menor potencia de 10 que torna o passo
+                    inteiro (None se nao houver), ou None se a exchange nao
+                    informar o filtro
+        """
+        key = (pair, name)
+        if key not in self.filters:
+            if (pair not in self.info) or (name not in self.info[pair]):
                 self.update_info()
-            if (pair in self.info) and ('quantity_filter' in self.info[pair]):
-                filter = self.info[pair]['quantity_filter']
-                quantity = D(int(quantity / float(filter))) * D(filter)
-        return quantity
+            if (pair not in self.info) or (name not in self.info[pair]):
+                return None
+            filter = str(self.info[pair][name])
+            fraction = Fraction(filter)
+            scale = None
+            for k in range(19):
+                if (10**k) % fraction.denominator == 0:
+                    scale = 10**k
+                    break
+            self.filters[key] = (D(filter), fraction, fraction.denominator / fraction.numerator, scale)
+        return self.filters[key]
+
+    def apply_filter(self, pair, name, value):
+        """ Arredonda o valor para baixo no passo do filtro, contando passos
+            inteiros de forma exata. O resultado nunca e maior que o valor
+            recebido. Apenas o resultado vira Decimal, para a API
+
+            O numero de passos sai da divisao em float quando ela esta longe de
+            um multiplo do passo. Perto de um multiplo (o caso de valores ja na
+            grade), o valor e lido como inteiro na escala do passo, o que e
+            exato se o float for o proprio decimal. So os valores fora da grade
+            e ambiguos, ou que nao sejam float/int, passam por Fraction """
+        if (value is not None) and (value > 0):
+            filter = self.get_filter(pair, name)
+            if filter is not None:
+                step, fraction, ratio, scale = filter
+                steps = None
+                if isinstance(value, (int, float)):
+                    x = value * ratio
+                    if x < 1e15:
+                        steps = int(x)
+                        tolerance = x * 1e-12
+                        if (x - steps <= tolerance) or (steps + 1 - x <= tolerance):
+                            steps = None
+                            if scale is not None:
+                                units = round(value * scale)
+                                if (units < 10**15) and (units / scale == value):
+                                    steps = (units * fraction.denominator) // (scale * fraction.numerator)
+                if steps is None:
+                    steps = floor(Fraction(str(value)) / fraction)
+                value = step * steps
+        return value
+
+    def filter_quantity(self, pair, quantity):
+        return self.apply_filter(pair, 'quantity_filter', quantity)
 
     def filter_price(self, pair, price):
-        if (price is not None) and (price > 0):
-            if pair not in self.info:
-                self.update_info()
-            if 'price_filter' not in self.info[pair]:
-                self.update_info()
-            if (pair in self.info) and ('price_filter' in self.info[pair]):
-                filter = self.info[pair]['price_filter']
-                price = D(int(price / float(filter))) * D(filter)
-        return price
+        return self.apply_filter(pair, 'price_filter', price)
 
     # Rate Limit Control -------------------------------------------------------
     def get_rate_limit(self):
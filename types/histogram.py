@@ -0,0 +1,106 @@
+from time import perf_counter_ns
+
+
+class Histogram:
+    """ Histograma log-linear no estilo HDR para latencias em nanossegundos.
+        Valores abaixo de 2^precision sao exatos; acima disso cada potencia de
+        2 e dividida em 2^(precision - 1) faixas, o que da um erro relativo
+        maximo de 2^-(precision - 1). Registrar um valor custa um calculo de
+        indice e um incremento em um dicionario. """
+    def __init__(self, precision=6):
+        """ Inicializacao da classe
+
+            Args:
+                precision (int): Bits de resolucao por potencia de 2
+        """
+        self.precision = precision
+        self.sub_buckets = 1 << precision
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def bucket(self, value):
+        if value < self.sub_buckets:
+            return value
+        shift = value.bit_length() - self.precision
+        return (shift * self.sub_buckets) + (value >> shift)
+
+    def bucket_value(self, index):
+        if index < self.sub_buckets:
+            return index
+        shift = index // self.sub_buckets
+        return (index % self.sub_buckets) << shift
+
+    def record(self, value):
+        """ Registra um valor
+
+            Args:
+                value (int): Latencia em nanossegundos
+        """
+        value = max(0, int(value))
+        index = self.bucket(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+        if (self.min is None) or (value < self.min):
+            self.min = value
+
+    def percentile(self, p):
+        """ Retorna o limite inferior da faixa que contem o percentil p
+
+            Args:
+                p (float): Percentil entre 0 e 100
+            Returns:
+                (int): Latencia em nanossegundos
+        """
+        if self.count == 0:
+            return 0
+        target = max(1, int(round(self.count * p / 100)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return self.bucket_value(index)
+        return self.max
+
+    def merge(self, other):
+        for index in other.counts:
+            self.counts[index] = self.counts.get(index, 0) + other.counts[index]
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+
+    def get_summary(self):
+        """ Resumo do histograma em microssegundos
+
+            Returns:
+                (dict): count, mean, min, max e percentis 50, 90, 99 e 99.9
+        """
+        return {'count': self.count,
+                'mean': (self.total / self.count / 1000) if self.count > 0 else 0,
+                'min': (self.min or 0) / 1000,
+                'max': self.max / 1000,
+                'p50': self.percentile(50) / 1000,
+                'p90': self.percentile(90) / 1000,
+                'p99': self.percentile(99) / 1000,
+                'p999': self.percentile(99.9) / 1000}
+
+
+def record_latency(histograms, key, start):
+    """ Registra em histograms[key] o tempo decorrido desde start
+
+        Args:
+            histograms (dict): Histogramas indexados por key
+            key (str): Normalmente o nome do evento
+            start (int): Instante inicial obtido com perf_counter_ns
+    """
+    elapsed = perf_counter_ns() - start
+    if key not in histograms:
+        histograms[key] = Histogram()
+    histograms[key].record(elapsed)
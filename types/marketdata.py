@@ -1,4 +1,26 @@
+import numpy as np
 from queue import Queue
+from fractions import Fraction
+from threading import Lock
+# Asimov -----------------------------------------------------------------------
+from .book import BookSide, BookView
+from .candles import CandleSeries
+from .tape import Tape
+
+
+# Resolucao usada enquanto o price_filter do par nao e conhecido, ou quando um
+# preco recebido nao cai na grade do price_filter
+DEFAULT_PRICE_TICK = '0.00000001'
+# Quantidades do book sao guardadas em unidades de 1e-8
+QUANTITY_UNIT = 10**8
+# Campos de ticker do snapshot e os atributos de onde sao copiados
+TICKER_FIELDS = {'bid': 'bid',
+                 'ask': 'ask',
+                 'bid_quantity': 'bid_quantity',
+                 'ask_quantity': 'ask_quantity',
+                 'last_buy': 'last_notified_buy',
+                 'last_sell': 'last_notified_sell',
+                 'last': 'last'}
 
 
 class MarketData:
@@ -10,26 +32,80 @@ class MarketData:
         self.ask_quantity = {}
         self.book = {}
         self.book_queue = {}
+        self.book_engine = None
+        self.book_lock = Lock()
+        self.ticks = {}
+        self.off_grid = set()
+        self.filtered = set()
+        # Depth ladder ---------------------------------------------------------
+        self.depth = {}
+        self.default_depth = None
+        self.ladder_changes = {}
+        # Trade tape -----------------------------------------------------------
+        self.tapes = {}
+        self.tape_capacity = {}
+        self.default_tape_capacity = 10000
+        # Candles --------------------------------------------------------------
+        self.candles = {}
+        self.candle_resolutions = [60]
+        self.candle_size = 1440
+        # Analytics ------------------------------------------------------------
+        self.book_versions = {}
         # Notify control -------------------------------------------------------
         self.last_notified_buy = {}
         self.last_notified_sell = {}
+        # Snapshot -------------------------------------------------------------
+        self.version = 0
+        self.snapshot = None
+        self.publish_lock = Lock()
+        self.publish()
 
-    def get_data(self):
+    def get_data(self, book=False):
         """ Retorna os dados de ticker do objeto marketdata
 
+            Args:
+                book (bool): Se inclui o book em float de todos os pares, da
+                    mesma versao publicada
             Returns:
-                (dict): Dicionario contendo os precos de bid, ask e last de
-                    todos pares
+                (dict): Versao imutavel mais recente contendo os precos de bid,
+                    ask e last de todos pares. Nao deve ser alterada
+        """
+        snapshot = self.snapshot
+        if book:
+            return dict(snapshot, book={pair: snapshot['book_views'][pair].get() for pair in snapshot['book_views']})
+        return snapshot
+
+    def publish(self, book_pair=None, fields=None):
+        """ Publica uma nova versao copy-on-write dos dados. Os leitores pegam
+            a versao corrente em get_data sem lock e sem deepcopy; apenas os
+            dicionarios alterados sao copiados, os demais sao compartilhados
+            com a versao anterior. O book do par indicado e guardado como uma
+            BookView, que so e convertida para float quando lida. Com
+            book_pair, deve ser chamada com book_lock adquirido
+
+            Args:
+                book_pair (str): Par cujo book mudou desde a ultima versao
+                fields (list): Campos do snapshot alterados ('bid', 'ask',
+                    'bid_quantity', 'ask_quantity', 'last', 'last_buy',
+                    'last_sell'). Se None, copia todos
         """
-        d = {'bid': self.bid,
-             'ask': self.ask,
-             'bid_quantity': self.bid_quantity,
-             'ask_quantity': self.ask_quantity,
-             'last_buy': self.last_notified_buy,
-             'last_sell': self.last_notified_sell,
-             'last': self.last,
-             'book': self.book}
-        return d
+        self.publish_lock.acquire()
+        try:
+            previous = self.snapshot if self.snapshot is not None else {'book_version': {}, 'book_views': {}}
+            d = dict(previous)
+            for field in (TICKER_FIELDS if fields is None else fields):
+                d[field] = dict(getattr(self, TICKER_FIELDS[field]))
+            if (book_pair is not None) and (book_pair in self.book):
+                self.book_versions[book_pair] = self.book_versions.get(book_pair, 0) + 1
+                d['book_version'] = dict(previous['book_version'])
+                d['book_version'][book_pair] = self.book_versions[book_pair]
+                d['book_views'] = dict(previous['book_views'])
+                d['book_views'][book_pair] = BookView(self.book[book_pair], self.get_tick(book_pair), QUANTITY_UNIT)
+            self.version += 1
+            d['version'] = self.version
+            self.snapshot = d
+        finally:
+            self.publish_lock.release()
 
     def set_market_data(self, data):
         if 'bid' in data:
@@ -38,6 +114,7 @@ class MarketData:
             self.ask = data['ask']
         if 'last' in data:
             self.last = data['last']
+        self.publish(fields=[field for field in ['bid', 'ask', 'last'] if field in data])
 
     def update_market_data(self, pair, data, side=None, tolerance=0):
         """ Atualiza os dados basicos de ticker
@@ -75,6 +152,8 @@ class MarketData:
                 previous = self.ask[pair]
             self.ask[pair] = data['ask']
             change = change or (previous != self.ask[pair])
+        fields = ['last', 'last_buy', 'last_sell'] if 'last' in data else []
+        self.publish(fields=fields + [field for field in ['bid', 'ask'] if field in data])
         return change
 
     def queue_entry(self, entry):
@@ -86,17 +165,130 @@ class MarketData:
         """
         if 'pair' in entry:
             pair = entry['pair']
+            if self.book_engine is not None:
+                self.book_engine.put(entry)
+                return
             if pair not in self.book_queue:
                 self.book_queue[pair] = Queue()
             self.book_queue[pair].put(entry)
 
-    def insert_entry(self, entry):
-        """ Insere uma entrada nova no book
+    # Ticks --------------------------------------------------------------------
+    def get_tick(self, pair):
+        if pair not in self.ticks:
+            self.ticks[pair] = Fraction(DEFAULT_PRICE_TICK)
+        return self.ticks[pair]
+
+    def set_filters(self, info):
+        """ Ajusta o tamanho do tick de cada par ao price_filter informado. Os
+            books ja existentes sao convertidos para o novo tick
+
+            Args:
+                info (dict): Informacoes dos pares no formato de get_info
+        """
+        for pair in info:
+            if isinstance(info[pair], dict) and ('price_filter' in info[pair]):
+                try:
+                    tick = Fraction(str(info[pair]['price_filter']))
+                except (ValueError, ZeroDivisionError):
+                    continue
+                if (tick > 0) and (pair not in self.off_grid):
+                    self.set_tick(pair, tick)
+                    self.filtered.add(pair)
+
+    def set_tick(self, pair, tick):
+        self.book_lock.acquire()
+        try:
+            if tick != self.get_tick(pair):
+                self.rescale_book(pair, tick)
+        finally:
+            self.book_lock.release()
+
+    def rescale_book(self, pair, tick):
+        """ Troca o tick do par, convertendo o book existente. Deve ser
+            chamada com book_lock adquirido
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                tick (Fraction): Novo tamanho do tick
+        """
+        ratio = self.get_tick(pair) / tick
+        sides = {}
+        for book_side in self.book.get(pair, {}):
+            side = self.book[pair][book_side]
+            sides[book_side] = BookSide(book_side, {int(round(price * ratio)): side[price] for price in side})
+        # Os lados novos so entram junto com o tick novo
+        self.ticks[pair] = tick
+        if sides != {}:
+            self.book[pair] = sides
+
+    def has_filter(self, pair):
+        """ Se os ticks do par seguem o price_filter da exchange """
+        return (pair in self.filtered) and (pair not in self.off_grid)
+
+    def price_to_ticks(self, pair, price):
+        """ Converte um preco recebido da exchange para ticks inteiros. Se o
+            preco nao cair na grade do tick atual, o par volta para a
+            resolucao padrao e deixa de seguir o price_filter. Deve ser chamada com book_lock adquirido
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                price (str/float): Preco
+            Returns:
+                (int): Preco em ticks
+        """
+        tick = self.get_tick(pair)
+        scaled = float(price) * tick.denominator / tick.numerator
+        ticks = int(round(scaled))
+        if (abs(scaled - ticks) > 1e-6) and (tick != Fraction(DEFAULT_PRICE_TICK)):
+            self.off_grid.add(pair)
+            self.rescale_book(pair, Fraction(DEFAULT_PRICE_TICK))
+            return self.price_to_ticks(pair, price)
+        return ticks
+
+    def ticks_to_price(self, pair, ticks):
+        tick = self.get_tick(pair)
+        return ticks * tick.numerator / tick.denominator
+
+    def quantity_to_units(self, quantity):
+        """ Converte uma quantidade recebida da exchange para unidades
+            inteiras. Uma quantidade positiva menor que meia unidade vira uma
+            unidade, para que uma linha viva nao seja tratada como remocao
+
+            Args:
+                quantity (str/float): Quantidade
+            Returns:
+                (int): Quantidade em unidades de 1/QUANTITY_UNIT
+        """
+        quantity = float(quantity)
+        units = int(round(quantity * QUANTITY_UNIT))
+        if (units == 0) and (quantity > 0):
+            return 1
+        return units
+
+    # Book ---------------------------------------------------------------------
+    def set_book_engine(self, engine):
+        """ Direciona as proximas entradas de book para um BookEngine. As
+            entradas que ja estavam nas filas por par sao repassadas em ordem
+
+            Args:
+                engine (BookEngine): Motor de book
+        """
+        self.book_engine = engine
+        for pair in list(self.book_queue):
+            while not self.book_queue[pair].empty():
+                engine.put(self.book_queue[pair].get())
+
+    def insert_entry(self, entry, update_top=True):
+        """ Insere uma entrada nova no book. A nova versao do book so e
+            publicada em publish(book_pair=pair), para que um lote de entradas
+            gere uma unica copia
 
             Args:
                 entry (dict): Dicionario com as chaves 'pair', 'side', 'price' e
                     'quantity' a serem atualizadas no book. No caso da quantidade
                     ser 0, deleta a linha do book
+                update_top (bool): Se recalcula o topo. Em lotes, o topo e
+                    recalculado uma vez por update_book_top ao fim do lote
             Returns:
                 (bool): Se houve ou nao mudanca no preco do topo do book
         """
@@ -104,16 +296,26 @@ class MarketData:
         if 'pair' in entry:
             pair = entry['pair']
             book_side = entry['side']
-            price = entry['price']
-            quantity = entry['quantity']
-            if pair not in self.book:
-                self.book[pair] = {'bid': {}, 'ask': {}}
-            if quantity == 0:
-                if price in self.book[pair][book_side]:
-                    del self.book[pair][book_side][price]
-            else:
-                self.book[pair][book_side][price] = quantity
-            change = self.update_book_top(pair, book_side)
+            self.book_lock.acquire()
+            try:
+                price = self.price_to_ticks(pair, entry['price'])
+                quantity = self.quantity_to_units(entry['quantity'])
+                if pair not in self.book:
+                    self.book[pair] = {'bid': BookSide('bid'), 'ask': BookSide('ask')}
+                side = self.book[pair][book_side]
+                exists = price in side
+                rank = side.rank(price)
+                if quantity == 0:
+                    if exists:
+                        del side[price]
+                        self.mark_ladder(pair, book_side, rank, shift=True)
+                else:
+                    side[price] = quantity
+                    self.mark_ladder(pair, book_side, rank, shift=not exists)
+                if update_top:
+                    change = self.update_book_top(pair, book_side)
+            finally:
+                self.book_lock.release()
         return change
 
     def set_book(self, pair, book_side, raw_book):
@@ -123,19 +325,389 @@ class MarketData:
                 pair (str): Par no formato padrao Asimov
                 book_side (str): Lado do book ('bid' ou 'ask')
                 raw_book (dict): Book no formato {P1: Q1, P2: Q2, P3: Q3 ...}
-                    onde Pn e uma string identificando o preco da linha e Qn e a
-                    quantidade total em float na linha.
+                    onde Pn e o preco da linha, em string ou float, e Qn e a
+                    quantidade total na linha.
 
             Returns:
                 (bool): Se houve ou nao mudanca no preco do topo do book
         """
-        if pair not in self.book:
-            self.book[pair] = {'bid': {}, 'ask': {}}
-        self.book[pair][book_side] = {price: float(raw_book[price]) for price in raw_book}
-        return self.update_book_top(pair, book_side)
+        self.book_lock.acquire()
+        try:
+            if pair not in self.book:
+                self.book[pair] = {'bid': BookSide('bid'), 'ask': BookSide('ask')}
+            levels = {}
+            for raw_price in raw_book:
+                quantity = self.quantity_to_units(raw_book[raw_price])
+                if quantity > 0:
+                    levels[self.price_to_ticks(pair, raw_price)] = quantity
+            self.book[pair][book_side] = BookSide(book_side, levels)
+            self.mark_ladder(pair, book_side, 0, shift=True)
+            change = self.update_book_top(pair, book_side)
+        finally:
+            self.book_lock.release()
+        return change
+
+    def truncate_book(self, pair, levels):
+        """ Descarta os niveis alem dos N melhores de cada lado, para books
+            assinados com profundidade fixa
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                levels (int): Numero de niveis mantidos
+        """
+        if pair in self.book:
+            self.book_lock.acquire()
+            try:
+                for book_side in self.book[pair]:
+                    side = self.book[pair][book_side]
+                    if len(side) > levels:
+                        for price, quantity in side.top()[levels:]:
+                            del side[price]
+                        self.mark_ladder(pair, book_side, levels, shift=True)
+            finally:
+                self.book_lock.release()
+
+    # Depth Ladder -------------------------------------------------------------
+    def set_depth(self, depth, pair=None):
+        """ Configura o numero de niveis da escada de profundidade
+
+            Args:
+                depth (int/dict): Numero de niveis, ou dicionario com o numero
+                    de niveis por par. None ou 0 desliga a escada
+                pair (str): Se informado, configura apenas este par
+        """
+        if isinstance(depth, dict):
+            for p in depth:
+                self.set_depth(depth[p], pair=p)
+        elif pair is None:
+            self.default_depth = depth or None
+        else:
+            self.depth[pair] = depth or None
+            self.ladder_changes.pop(pair, None)
+
+    def get_depth(self, pair):
+        return self.depth[pair] if pair in self.depth else self.default_depth
+
+    def mark_ladder(self, pair, book_side, rank, shift=False):
+        """ Marca os niveis da escada afetados por uma alteracao no book
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                book_side (str): Lado do book ('bid' ou 'ask')
+                rank (int): Posicao da linha alterada, a partir do melhor nivel
+                shift (bool): Se a linha foi inserida ou removida, deslocando
+                    todos os niveis abaixo dela
+        """
+        n = self.get_depth(pair)
+        if (n is not None) and (rank < n):
+            if pair not in self.ladder_changes:
+                self.ladder_changes[pair] = {'bid': set(), 'ask': set()}
+            if shift:
+                self.ladder_changes[pair][book_side].update(range(rank, n))
+            else:
+                self.ladder_changes[pair][book_side].add(rank)
+
+    def get_ladder(self, pair):
+        """ Retorna a escada de profundidade do par e os niveis alterados
+            desde a ultima chamada. Le apenas os N primeiros niveis ja
+            ordenados do book
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+            Returns:
+                (dict): {'bid': [[P1, Q1], ...], 'ask': [[P1, Q1], ...],
+                    'changed': {'bid': [bool, ...], 'ask': [bool, ...]}} ou
+                    None se a escada estiver desligada para o par
+        """
+        n = self.get_depth(pair)
+        if n is None:
+            return None
+        changes = self.ladder_changes.pop(pair, {'bid': set(), 'ask': set()})
+        ladder = {'changed': {}}
+        for book_side in ['bid', 'ask']:
+            ladder[book_side] = [[price, quantity] for price, quantity in self.get_book_top(pair, book_side, n)]
+            ladder['changed'][book_side] = [i in changes[book_side] for i in range(len(ladder[book_side]))]
+        return ladder
+
+    def has_ladder_changes(self, pair):
+        changes = self.ladder_changes.get(pair)
+        return (changes is not None) and ((changes['bid'] != set()) or (changes['ask'] != set()))
+
+    # Trade Tape ---------------------------------------------------------------
+    def set_tape_capacity(self, capacity, pair=None):
+        """ Configura a capacidade do buffer de trades. Vale para os buffers
+            criados depois da chamada
+
+            Args:
+                capacity (int/dict): Numero de trades mantidos, ou dicionario
+                    com a capacidade por par. None ou 0 desliga o buffer
+                pair (str): Se informado, configura apenas este par
+        """
+        if isinstance(capacity, dict):
+            for p in capacity:
+                self.set_tape_capacity(capacity[p], pair=p)
+        elif pair is None:
+            self.default_tape_capacity = capacity or None
+        else:
+            self.tape_capacity[pair] = capacity or None
+
+    def record_trade(self, trade, pair=None):
+        """ Grava um trade do websocket no buffer do par
+
+            Args:
+                trade (dict): Trade no formato padrao Asimov
+                pair (str): Par no formato padrao Asimov, quando o trade nao o
+                    traz padronizado
+            Returns:
+                (list): Candles fechados pelo trade
+        """
+        pair = trade['pair'] if pair is None else pair
+        if pair not in self.tapes:
+            capacity = self.tape_capacity[pair] if pair in self.tape_capacity else self.default_tape_capacity
+            self.tapes[pair] = Tape(capacity) if capacity else None
+        if self.tapes[pair] is not None:
+            self.tapes[pair].append(trade['timestamp'], trade['price'], trade['quantity'], trade['side'])
+        return self.update_candles(pair, trade)
+
+    def get_tape(self, pair):
+        return self.tapes.get(pair)
+
+    def get_recent_trades(self, pair, window=None, start=None, end=None):
+        """ Consulta os trades recentes do par sem ir a exchange
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                window (float): Se informado, retorna os ultimos 'window'
+                    segundos ate o ultimo trade (ou ate 'end')
+                start (float): Timestamp inicial, inclusive
+                end (float): Timestamp final, inclusive
+            Returns:
+                (dict): Views dos arrays 'timestamp', 'price', 'quantity' e
+                    'side', ou None se nao houver buffer para o par
+        """
+        tape = self.tapes.get(pair)
+        if tape is None:
+            return None
+        if window is not None:
+            return tape.get_window(window, now=end)
+        return tape.get_range(start=start, end=end)
+
+    # Candles ------------------------------------------------------------------
+    def set_candle_resolutions(self, resolutions, size=1440):
+        """ Configura as resolucoes dos candles montados pelo websocket
+
+            Args:
+                resolutions (list): Duracoes dos candles em segundos. Lista
+                    vazia desliga os candles
+                size (int): Numero de candles fechados mantidos por serie
+        """
+        self.candle_resolutions = list(resolutions)
+        self.candle_size = size
+
+    def update_candles(self, pair, trade):
+        closed = []
+        for resolution in self.candle_resolutions:
+            key = (pair, resolution)
+            if key not in self.candles:
+                self.candles[key] = CandleSeries(pair, resolution=resolution, size=self.candle_size)
+            closed += self.candles[key].add_trade(trade['timestamp'], trade['price'], trade['quantity'])
+        return closed
+
+    def get_candles(self, pair, window, resolution=60, now=None):
+        """ Retorna candles montados em memoria
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                window (int): Numero de candles
+                resolution (int): Duracao dos candles em segundos
+                now (float): Instante da consulta, para descartar series sem
+                    trades recentes
+            Returns:
+                (list): Candles fechados do mais antigo para o mais novo, com
+                    indice no fechamento em segundos, ou None se a serie ainda
+                    nao estiver aquecida
+        """
+        if (pair, resolution) not in self.candles:
+            return None
+        return self.candles[(pair, resolution)].get(window, now=now)
+
+    def backfill_candles(self, pair, candles, resolution=60, now=None):
+        if resolution in self.candle_resolutions:
+            if (pair, resolution) not in self.candles:
+                self.candles[(pair, resolution)] = CandleSeries(pair, resolution=resolution, size=self.candle_size)
+            self.candles[(pair, resolution)].backfill(candles, now=now)
+
+    # Analytics ----------------------------------------------------------------
+    def get_book(self, pair):
+        """ Retorna o book do ultimo snapshot publicado com precos e
+            quantidades em float, sem lock. O dicionario e montado na primeira
+            leitura de cada versao e nao deve ser alterado
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+            Returns:
+                (dict): Dicionario {'bid': {preco: quantidade}, 'ask': {...}}
+                    do melhor para o pior preco
+        """
+        view = self.snapshot['book_views'].get(pair)
+        return view.get() if view is not None else {}
+
+    def get_book_arrays(self, pair, book_side):
+        """ Retorna um lado do ultimo book publicado como arrays NumPy
+            contiguos, do melhor para o pior preco. Os arrays sao montados uma
+            vez por versao do book do par e nao devem ser alterados
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                book_side (str): Lado do book ('bid' ou 'ask')
+            Returns:
+                (tuple): Arrays float64 de precos e de quantidades
+        """
+        view = self.snapshot['book_views'].get(pair)
+        if view is None:
+            return (np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64))
+        if view.arrays is None:
+            arrays = {}
+            book = view.get()
+            for side in ['bid', 'ask']:
+                levels = book.get(side, {})
+                arrays[side] = (np.fromiter(levels.keys(), dtype=np.float64, count=len(levels)),
+                                np.fromiter(levels.values(), dtype=np.float64, count=len(levels)))
+            view.arrays = arrays
+        return view.arrays[book_side]
+
+    def get_vwap(self, pair, book_side, quantity):
+        """ Preco medio para executar uma quantidade contra um lado do book
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                book_side (str): Lado consumido ('ask' para compra, 'bid' para
+                    venda)
+                quantity (float): Quantidade a executar
+            Returns:
+                (float): Preco medio ou None se o book nao tiver profundidade
+                    suficiente
+        """
+        prices, quantities = self.get_book_arrays(pair, book_side)
+        if (quantity <= 0) or (len(prices) == 0):
+            return None
+        cumulative = np.cumsum(quantities)
+        i = int(np.searchsorted(cumulative, quantity))
+        if i >= len(prices):
+            return None
+        filled = cumulative[i - 1] if i > 0 else 0.0
+        cost = np.dot(prices[:i], quantities[:i]) + (quantity - filled) * prices[i]
+        return float(cost / quantity)
+
+    def get_depth_at_price(self, pair, book_side, price):
+        """ Quantidade acumulada em um lado do book ate um preco, inclusive
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                book_side (str): Lado do book ('bid' ou 'ask')
+                price (float): Preco limite. No bid conta os niveis com preco
+                    maior ou igual, no ask os com preco menor ou igual
+            Returns:
+                (float): Quantidade acumulada
+        """
+        prices, quantities = self.get_book_arrays(pair, book_side)
+        if book_side == 'bid':
+            n = int(np.searchsorted(-prices, -price, side='right'))
+        else:
+            n = int(np.searchsorted(prices, price, side='right'))
+        return float(quantities[:n].sum())
+
+    def get_imbalance(self, pair, levels=None):
+        """ Desequilibrio entre as quantidades de bid e ask
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                levels (int): Numero de niveis considerados. Se None, usa o
+                    book inteiro
+            Returns:
+                (float): (bid - ask) / (bid + ask), entre -1 e 1, ou None se o
+                    book estiver vazio
+        """
+        bid = self.get_book_arrays(pair, 'bid')[1][:levels].sum()
+        ask = self.get_book_arrays(pair, 'ask')[1][:levels].sum()
+        if bid + ask == 0:
+            return None
+        return float((bid - ask) / (bid + ask))
+
+    def get_slippage(self, pair, side, quantity):
+        """ Custo relativo de executar uma quantidade a mercado em relacao ao
+            topo do book
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                side (str): Lado da ordem ('buy' ou 'sell')
+                quantity (float): Quantidade a executar
+            Returns:
+                (float): Diferenca relativa entre o preco medio e o melhor
+                    preco, positiva quando desfavoravel, ou None se o book nao
+                    tiver profundidade suficiente
+        """
+        book_side = 'ask' if side == 'buy' else 'bid'
+        vwap = self.get_vwap(pair, book_side, quantity)
+        if vwap is None:
+            return None
+        best = self.get_book_arrays(pair, book_side)[0][0]
+        return float((vwap - best) / best) if side == 'buy' else float((best - vwap) / best)
+
+    def get_book_top(self, pair, book_side, n=None):
+        """ Retorna os N melhores niveis de um lado do book
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                book_side (str): Lado do book ('bid' ou 'ask')
+                n (int): Numero de niveis. Se None, retorna todos
+
+            Returns:
+                (list): Lista de tuplas (preco, quantidade) em float, do melhor
+                    para o pior preco
+        """
+        if (pair not in self.book) or (book_side not in self.book[pair]):
+            return []
+        tick = self.get_tick(pair)
+        return [(price * tick.numerator / tick.denominator, quantity / QUANTITY_UNIT) for price, quantity in self.book[pair][book_side].top(n)]
+
+    def refresh_book(self, pair, force=False):
+        """ Fecha um lote de entradas de book: recalcula o topo dos dois
+            lados, publica a nova versao do book e monta a atualizacao do par.
+            Tudo e feito com book_lock adquirido, para que uma troca de tick
+            feita por set_filters em outra thread nunca seja vista pela metade
+
+            Args:
+                pair (str): Par no formato padrao Asimov
+                force (bool): Se monta a atualizacao mesmo sem mudanca no topo
+                    nem na escada de profundidade
+            Returns:
+                (dict): Atualizacao com 'bid', 'ask', 'bid_quantity',
+                    'ask_quantity' e, se configurada, a escada em 'depth'. None
+                    se nada mudou ou se o book ainda nao tiver os dois lados
+        """
+        self.book_lock.acquire()
+        try:
+            change = self.update_book_top(pair, 'bid')
+            change = self.update_book_top(pair, 'ask') or change
+            self.publish(book_pair=pair, fields=['bid', 'ask', 'bid_quantity', 'ask_quantity'])
+            update = None
+            if (change or force or self.has_ladder_changes(pair)) and (pair in self.bid) and (pair in self.ask):
+                update = {'bid': self.bid[pair],
+                          'ask': self.ask[pair],
+                          'bid_quantity': self.bid_quantity[pair],
+                          'ask_quantity': self.ask_quantity[pair]}
+                ladder = self.get_ladder(pair)
+                if ladder is not None:
+                    update['depth'] = ladder
+        finally:
+            self.book_lock.release()
+        return update
 
     def update_book_top(self, pair, book_side):
-        """ Atualiza os precos do topo do book
+        """ Atualiza os precos do topo do book. O melhor preco vem da lista
+            ordenada mantida pelo BookSide, sem percorrer o book. E aqui que os
+            ticks do topo voltam a ser float
 
             Args:
                 pair (str): Par no formato padrao Asimov
@@ -150,15 +722,15 @@ class MarketData:
             if book_side == 'bid':
                 if pair in self.bid:
                     previous = self.bid[pair]
-                raw_bid = max(self.book[pair]['bid'])
-                self.bid[pair] = float(raw_bid)
-                self.bid_quantity[pair] = self.book[pair]['bid'][raw_bid]
+                raw_bid = self.book[pair]['bid'].best()
+                self.bid[pair] = self.ticks_to_price(pair, raw_bid)
+                self.bid_quantity[pair] = self.book[pair]['bid'][raw_bid] / QUANTITY_UNIT
                 change = previous != self.bid[pair]
             elif book_side == 'ask':
                 if pair in self.ask:
                     previous = self.ask[pair]
-                raw_ask = min(self.book[pair]['ask'])
-                self.ask[pair] = float(raw_ask)
-                self.ask_quantity[pair] = self.book[pair]['ask'][raw_ask]
+                raw_ask = self.book[pair]['ask'].best()
+                self.ask[pair] = self.ticks_to_price(pair, raw_ask)
+                self.ask_quantity[pair] = self.book[pair]['ask'][raw_ask] / QUANTITY_UNIT
                 change = change or (previous != self.ask[pair])
         return change
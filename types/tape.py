@@ -0,0 +1,90 @@
+import numpy as np
+
+
+SIDES = {'buy': 1, 'sell': -1}
+
+
+class Tape:
+    """ Buffer circular de trades de um par com memoria fixa. Cada coluna
+        (timestamp, preco, quantidade e lado) e um array pre-alocado com o
+        dobro da capacidade, e cada trade e gravado nas duas metades. Assim os
+        ultimos N trades sempre ocupam uma faixa contigua e as consultas
+        retornam views, sem copia.
+
+        Ha um unico escritor (a thread do websocket). As views retornadas
+        apontam para o buffer e podem ser sobrescritas por trades novos depois
+        de 'capacity' gravacoes; quem precisar guardar os dados deve copia-los. """
+    def __init__(self, capacity=10000):
+        """ Inicializacao da classe
+
+            Args:
+                capacity (int): Numero maximo de trades mantidos
+        """
+        self.capacity = capacity
+        self.timestamp = np.zeros(2 * capacity, dtype=np.float64)
+        self.price = np.zeros(2 * capacity, dtype=np.float64)
+        self.quantity = np.zeros(2 * capacity, dtype=np.float64)
+        self.side = np.zeros(2 * capacity, dtype=np.int8)
+        self.count = 0
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, timestamp, price, quantity, side):
+        """ Grava um trade
+
+            Args:
+                timestamp (float): Timestamp do trade em segundos
+                price (float): Preco
+                quantity (float): Quantidade
+                side (str): Lado agressor ('buy' ou 'sell')
+        """
+        i = self.count % self.capacity
+        j = i + self.capacity
+        side = SIDES.get(side, 0)
+        self.timestamp[i] = self.timestamp[j] = timestamp
+        self.price[i] = self.price[j] = price
+        self.quantity[i] = self.quantity[j] = quantity
+        self.side[i] = self.side[j] = side
+        self.count += 1
+
+    def get_range(self, start=None, end=None):
+        """ Retorna os trades em um intervalo de tempo como views dos arrays
+
+            Args:
+                start (float): Timestamp inicial, inclusive. Se None, desde o
+                    trade mais antigo mantido
+                end (float): Timestamp final, inclusive. Se None, ate o ultimo
+                    trade
+            Returns:
+                (dict): Arrays 'timestamp', 'price', 'quantity' e 'side' (1
+                    compra, -1 venda), do mais antigo para o mais novo
+        """
+        last = (self.count % self.capacity) + self.capacity
+        first = last - len(self)
+        timestamps = self.timestamp[first:last]
+        if start is not None:
+            first += int(np.searchsorted(timestamps, start, side='left'))
+        if end is not None:
+            last = (last - len(timestamps)) + int(np.searchsorted(timestamps, end, side='right'))
+        last = max(first, last)
+        return {'timestamp': self.timestamp[first:last],
+                'price': self.price[first:last],
+                'quantity': self.quantity[first:last],
+                'side': self.side[first:last]}
+
+    def get_window(self, window, now=None):
+        """ Retorna os trades dos ultimos 'window' segundos
+
+            Args:
+                window (float): Tamanho da janela em segundos
+                now (float): Fim da janela. Se None, usa o timestamp do ultimo
+                    trade
+            Returns:
+                (dict): Mesmo formato de get_range
+        """
+        if now is None:
+            if self.count == 0:
+                return self.get_range()
+            now = self.timestamp[(self.count - 1) % self.capacity]
+        return self.get_range(start=now - window, end=now)
@@ -0,0 +1,129 @@
+""" Camada unica de JSON usada por conectores, exchanges e notificacoes.
+
+    Escolhe o backend mais rapido instalado (orjson, simdjson, ujson) e cai
+    para o json da biblioteca padrao quando nenhum estiver disponivel ou quando
+    o backend rapido recusar o objeto. Tanto loads quanto dumpb trabalham
+    direto com bytes, evitando decode/encode intermediarios.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import simdjson
+except ImportError:
+    simdjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+def _stdlib_dumps(obj):
+    return json.dumps(obj)
+
+
+def _stdlib_dumpb(obj):
+    return json.dumps(obj).encode('utf-8')
+
+
+if orjson is not None:
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    def _fast_loads(data):
+        return orjson.loads(data)
+
+    def _fast_dumpb(obj):
+        return orjson.dumps(obj, option=_OPTIONS)
+
+    def _fast_dumps(obj):
+        return orjson.dumps(obj, option=_OPTIONS).decode('utf-8')
+
+    LOADS_BACKEND = 'orjson'
+    DUMPS_BACKEND = 'orjson'
+elif ujson is not None:
+    def _fast_dumps(obj):
+        return ujson.dumps(obj)
+
+    def _fast_dumpb(obj):
+        return ujson.dumps(obj).encode('utf-8')
+
+    DUMPS_BACKEND = 'ujson'
+else:
+    _fast_dumps = _stdlib_dumps
+    _fast_dumpb = _stdlib_dumpb
+    DUMPS_BACKEND = 'json'
+
+if orjson is None:
+    if simdjson is not None:
+        def _fast_loads(data):
+            return simdjson.loads(data)
+
+        LOADS_BACKEND = 'simdjson'
+    elif ujson is not None:
+        def _fast_loads(data):
+            return ujson.loads(data)
+
+        LOADS_BACKEND = 'ujson'
+    else:
+        _fast_loads = _stdlib_loads
+        LOADS_BACKEND = 'json'
+
+
+def loads(data):
+    """ Decodifica JSON
+
+        Args:
+            data (str/bytes): Mensagem em JSON
+        Returns:
+            (dict/list): Objeto decodificado
+    """
+    try:
+        return _fast_loads(data)
+    except (ValueError, TypeError):
+        return json.loads(data)
+
+
+def dumps(obj):
+    """ Codifica para JSON
+
+        Args:
+            obj (dict/list): Objeto a ser codificado
+        Returns:
+            (str): Objeto em JSON
+    """
+    try:
+        return _fast_dumps(obj)
+    except (TypeError, ValueError, OverflowError):
+        return json.dumps(obj)
+
+
+def dumpb(obj):
+    """ Codifica para JSON em bytes UTF-8
+
+        Args:
+            obj (dict/list): Objeto a ser codificado
+        Returns:
+            (bytes): Objeto em JSON
+    """
+    try:
+        return _fast_dumpb(obj)
+    except (TypeError, ValueError, OverflowError):
+        return json.dumps(obj).encode('utf-8')
+
+
+BACKENDS = {'json': (_stdlib_loads, _stdlib_dumps)}
+if orjson is not None:
+    BACKENDS['orjson'] = (orjson.loads, lambda obj: orjson.dumps(obj).decode('utf-8'))
+if simdjson is not None:
+    BACKENDS['simdjson'] = (simdjson.loads, None)
+if ujson is not None:
+    BACKENDS['ujson'] = (ujson.loads, ujson.dumps)